@@ -6,7 +6,7 @@ from flask import Flask
 
 from config import get_database_uri
 from extensions import db
-from models import User, Product, Sale, SaleItem  # noqa: F401 - register models with db
+from models import User, Product, Sale, SaleItem, SalesRollup, ImportJob, Cart, CartLine, DiscogsCache  # noqa: F401 - register models with db
 from controllers.main import main_bp
 from controllers.auth import auth_bp
 from controllers.pages import pages_bp
@@ -14,11 +14,23 @@ from controllers.config_ctrl import config_bp
 from controllers.api_products import api_products_bp
 from controllers.api_cart import api_cart_bp
 from controllers.api_discogs import api_discogs_bp
+from controllers.api_sales import api_sales_bp
+from controllers.api_reports import api_reports_bp
+from commands import register_commands
+from utils.passwords import check_hash_method
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 app.config['SQLALCHEMY_DATABASE_URI'] = get_database_uri()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Werkzeug hash method for new passwords; stored hashes with other parameters are upgraded on login.
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+check_hash_method(app.config['PASSWORD_HASH_METHOD'])
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+# Imports up to this size run within the upload request; larger ones on a background thread (never on Vercel).
+app.config['IMPORT_INLINE_MAX_BYTES'] = int(os.environ.get('IMPORT_INLINE_MAX_BYTES', 256 * 1024))
+# Apply pending migrations on the first request; off on Vercel, where `flask migrate` runs at deploy time.
+app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', '0' if os.environ.get('VERCEL') else '1') == '1'
 
 db.init_app(app)
 
@@ -29,6 +41,10 @@ app.register_blueprint(config_bp)
 app.register_blueprint(api_products_bp)
 app.register_blueprint(api_cart_bp)
 app.register_blueprint(api_discogs_bp)
+app.register_blueprint(api_sales_bp)
+app.register_blueprint(api_reports_bp)
+
+register_commands(app)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
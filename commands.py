@@ -0,0 +1,124 @@
+"""
+Flask CLI commands (run with `flask --app app <command>`). Registered in app.
+"""
+import os
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from config import is_discogs_configured
+from extensions import db
+from models import Product
+from models.migrations import migrate, schema_version, LATEST_VERSION
+from models.cart import prune_stale_carts, CART_MAX_AGE
+from models.reports import rebuild_rollups
+from models.search import rebuild_search_index
+from utils.reencrypt import reencrypt_users, REENCRYPT_CHUNK_SIZE
+from utils.price_refresh import refresh_prices
+from utils.images import save_cover_derivatives, cover_variants
+
+
+def register_commands(app):
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(covers_backfill)
+    app.cli.add_command(rollups_rebuild)
+    app.cli.add_command(search_rebuild)
+    app.cli.add_command(reencrypt_users_command)
+    app.cli.add_command(prices_refresh)
+    app.cli.add_command(carts_prune)
+
+
+@click.command('migrate')
+@click.option('--status', is_flag=True, help='Only print the current and latest schema version.')
+@with_appcontext
+def migrate_command(status):
+    """Apply pending database schema migrations."""
+    if status:
+        click.echo(f'Schema version {schema_version()} (latest {LATEST_VERSION}).')
+        return
+    applied = migrate(log=click.echo)
+    click.echo(f'Applied {len(applied)} migration(s); schema is at version {LATEST_VERSION}.')
+
+
+@click.command('covers-backfill')
+@click.option('--keep-originals', is_flag=True, help='Do not delete the original upload after converting it.')
+@with_appcontext
+def covers_backfill(keep_originals):
+    """Generate resized WebP/JPEG derivatives for covers uploaded before they existed."""
+    uploads_dir = os.path.join(current_app.static_folder, 'uploads')
+    rows = db.session.query(Product.id, Product.cover_path).filter(Product.cover_path.isnot(None)).all()
+    converted = missing = failed = 0
+    for product_id, cover_path in rows:
+        if not cover_path or cover_variants(cover_path):
+            continue
+        source = os.path.join(current_app.static_folder, cover_path)
+        if not os.path.isfile(source):
+            missing += 1
+            continue
+        new_path = save_cover_derivatives(product_id, source, uploads_dir)
+        if not new_path:
+            failed += 1
+            click.echo(f'Could not read {cover_path}', err=True)
+            continue
+        Product.query.filter_by(id=product_id).update({'cover_path': new_path})
+        db.session.commit()
+        if not keep_originals:
+            os.remove(source)
+        converted += 1
+    click.echo(f'Converted {converted} cover(s); {missing} missing on disk, {failed} unreadable.')
+
+
+@click.command('rollups-rebuild')
+@with_appcontext
+def rollups_rebuild():
+    """Recompute the sales_rollup table from sale and sale_item history."""
+    n = rebuild_rollups()
+    db.session.commit()
+    click.echo(f'Wrote {n} rollup row(s).')
+
+
+@click.command('search-rebuild')
+@with_appcontext
+def search_rebuild():
+    """Re-index products for text search (SQLite; needed after a VACUUM)."""
+    if rebuild_search_index():
+        click.echo('Search index rebuilt.')
+    else:
+        click.echo('Nothing to rebuild: the Postgres search column is maintained by the database.')
+
+
+@click.command('reencrypt-users')
+@click.option('--chunk-size', default=REENCRYPT_CHUNK_SIZE, show_default=True, help='Users per transaction.')
+@click.option('--workers', type=int, default=None, help='Crypto worker processes (default: up to 4; 1 runs inline).')
+@click.option('--restart', is_flag=True, help='Ignore saved progress and start from the first user.')
+@with_appcontext
+def reencrypt_users_command(chunk_size, workers, restart):
+    """Re-encrypt usernames/emails under the primary key after adding a new APP_ENCRYPTION_KEY."""
+    n = reencrypt_users(chunk_size=chunk_size, workers=workers, restart=restart, log=click.echo)
+    click.echo(f'Done; {n} user(s) re-encrypted in this run.')
+
+
+@click.command('prices-refresh')
+@click.option('--currency', default='USD', show_default=True, help='Currency of the suggested prices.')
+@click.option('--max-age-days', default=7, show_default=True, help='Refresh prices older than this.')
+@click.option('--limit', type=int, default=None, help='Stop after this many products.')
+@with_appcontext
+def prices_refresh(currency, max_age_days, limit):
+    """Store Discogs suggested prices for the catalog, within the Discogs rate limit. Safe to interrupt and re-run."""
+    if not is_discogs_configured():
+        raise click.ClickException('Discogs is not configured (set DISCOGS_TOKEN or DISCOGS_CONSUMER_KEY/SECRET).')
+    counts = refresh_prices(currency=currency.upper()[:3], max_age=timedelta(days=max_age_days), limit=limit,
+                            log=click.echo)
+    click.echo(', '.join(f'{v} {k.replace("_", " ")}' for k, v in counts.items()))
+
+
+@click.command('carts-prune')
+@click.option('--days', default=CART_MAX_AGE.days, show_default=True,
+              help='Delete carts not updated for this many days.')
+@with_appcontext
+def carts_prune(days):
+    """Delete abandoned carts and their lines."""
+    n = prune_stale_carts(timedelta(days=days))
+    click.echo(f'Deleted {n} stale cart(s).')
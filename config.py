@@ -1,34 +1,100 @@
 """
 Application configuration: paths, database URI, config file.
 """
+import copy
 import json
 import os
+import tempfile
+import threading
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
+_instance_dir = None
+
+
+def get_instance_dir():
+    global _instance_dir
+    if _instance_dir is None:
+        base = '/tmp' if os.environ.get('VERCEL') else basedir
+        path = os.path.join(base, 'instance')
+        os.makedirs(path, exist_ok=True)
+        _instance_dir = path
+    return _instance_dir
+
+
 def get_config_file_path():
-    base = '/tmp' if os.environ.get('VERCEL') else basedir
-    instance_dir = os.path.join(base, 'instance')
-    os.makedirs(instance_dir, exist_ok=True)
-    return os.path.join(instance_dir, 'config.json')
+    return os.path.join(get_instance_dir(), 'config.json')
+
+
+class ConfigFile:
+    """
+    instance/config.json parsed once and kept in memory. Each read costs one stat(); the file is
+    re-parsed only when its mtime or size changes. Writes go to a temp file that replaces the original.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        self._stamp = None
+
+    def _current_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def read(self):
+        """Return a copy of the config dict ({} when missing or unreadable)."""
+        stamp = self._current_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                data = {}
+                if stamp is not None:
+                    try:
+                        with open(self.path, 'r', encoding='utf-8') as f:
+                            data = json.load(f)
+                    except Exception:
+                        data = {}
+                self._data = data if isinstance(data, dict) else {}
+                self._stamp = stamp
+            return copy.deepcopy(self._data)
+
+    def write(self, data):
+        fd, tmp = tempfile.mkstemp(prefix='.config-', suffix='.json', dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._data = copy.deepcopy(data)
+            self._stamp = self._current_stamp()
+
+
+_config_file = None
+
+
+def get_config_file():
+    global _config_file
+    if _config_file is None:
+        _config_file = ConfigFile(get_config_file_path())
+    return _config_file
 
 
 def read_config():
-    try:
-        path = get_config_file_path()
-        if os.path.isfile(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception:
-        pass
-    return {}
+    return get_config_file().read()
 
 
 def write_config(data):
-    path = get_config_file_path()
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
+    get_config_file().write(data)
 
 
 def get_database_uri():
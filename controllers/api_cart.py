@@ -1,22 +1,35 @@
 """
-API controller: cart (get, add, clear, checkout).
+API controller: cart (get, add, batch add, clear, checkout).
 """
-import uuid
+from datetime import datetime
 from flask import Blueprint, request, session, jsonify
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
 from extensions import db
 from models import Product, Sale, SaleItem
+from models.cart import cart_for_session, cart_lines, cart_units, cart_summary, add_items, discard_cart, line_to_dict
+from models.reports import record_sale
 from utils.i18n import t as _t
+from utils.qr import parse_product_code
 from controllers.decorators import login_required
 
 api_cart_bp = Blueprint('api_cart', __name__, url_prefix='/api')
 
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
 
 @api_cart_bp.route('/cart', methods=['GET'])
 @login_required
 def get_cart():
-    cart = session.get('cart', [])
-    total = sum(item['price'] for item in cart)
-    return jsonify({'cart': cart, 'total': total})
+    cart = cart_for_session(session)
+    return jsonify({'cart': cart_lines(cart), **cart_summary(cart)})
+
+
+def _add_one(product_id, name, price):
+    cart = cart_for_session(session, create=True)
+    line = add_items(cart, [(product_id, name, price)])[0]
+    db.session.commit()
+    return jsonify({'message': _t('msg_added_to_cart'), 'item': line_to_dict(line), **cart_summary(cart)}), 200
 
 
 @api_cart_bp.route('/cart', methods=['POST'])
@@ -24,56 +37,130 @@ def get_cart():
 def add_to_cart():
     data = request.get_json() or {}
     product_id = data.get('product_id')
+    if not product_id and data.get('code'):
+        product_id = parse_product_code(data['code'])
+        if not product_id:
+            return jsonify({'error': _t('invalid_qr')}), 400
     if product_id:
-        product = Product.query.get(product_id)
-        if product:
-            cart = session.get('cart', [])
-            cart.append({'id': str(uuid.uuid4()), 'name': product.name, 'price': product.price, 'product_id': product.id})
-            session['cart'] = cart
-            return jsonify({'message': _t('msg_added_to_cart'), 'cart': cart}), 200
+        row = db.session.query(Product.id, Product.name, Product.price).filter(Product.id == product_id).first()
+        if row:
+            return _add_one(row.id, row.name, row.price)
     if 'name' in data and 'price' in data:
-        cart = session.get('cart', [])
-        cart.append({
-            'id': str(uuid.uuid4()),
-            'name': data['name'],
-            'price': float(data['price']),
-            'product_id': data.get('id'),
-        })
-        session['cart'] = cart
-        return jsonify({'message': _t('msg_added_to_cart'), 'cart': cart}), 200
+        try:
+            price = float(data['price'])
+        except (TypeError, ValueError):
+            return jsonify({'error': _t('err_invalid_data')}), 400
+        return _add_one(data.get('id'), str(data['name']), price)
+    if data.get('code'):
+        return jsonify({'error': _t('err_product_not_found')}), 404
     return jsonify({'error': _t('err_invalid_data')}), 400
 
 
+@api_cart_bp.route('/cart/items', methods=['POST'])
+@login_required
+def add_items_to_cart():
+    """Add several products at once: one IN query and one cart update."""
+    data = request.get_json() or {}
+    product_ids = data.get('product_ids') or []
+    if not isinstance(product_ids, list):
+        return jsonify({'error': _t('err_invalid_product_ids')}), 400
+    product_ids = [str(pid) for pid in product_ids if pid]
+    if not product_ids:
+        return jsonify({'error': _t('err_no_valid_products')}), 400
+    rows = db.session.query(Product.id, Product.name, Product.price).filter(Product.id.in_(set(product_ids))).all()
+    by_id = {r.id: r for r in rows}
+    items = [(pid, by_id[pid].name, by_id[pid].price) for pid in product_ids if pid in by_id]
+    if not items:
+        return jsonify({'error': _t('err_product_not_found')}), 404
+    cart = cart_for_session(session, create=True)
+    add_items(cart, items)
+    db.session.commit()
+    return jsonify({
+        'message': _t('msg_added_n_to_cart', n=len(items)),
+        'added_count': len(items),
+        'not_found': len(product_ids) - len(items),
+        **cart_summary(cart),
+    }), 200
+
+
 @api_cart_bp.route('/cart', methods=['DELETE'])
 @login_required
 def clear_cart():
-    session['cart'] = []
+    discard_cart(session)
+    db.session.commit()
     return jsonify({'message': _t('msg_cart_cleared')}), 200
 
 
+def _idempotency_key():
+    """Idempotency-Key header or JSON field; None when absent, '' when malformed."""
+    data = request.get_json(silent=True) or {}
+    key = (request.headers.get('Idempotency-Key') or data.get('idempotency_key') or '').strip()
+    if not key:
+        return None
+    return key if len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH else ''
+
+
+def _checkout_response(sale_id, items_count, replayed=False):
+    return jsonify({
+        'message': _t('checkout_success'),
+        'sale_id': sale_id,
+        'items_count': items_count,
+        'replayed': replayed,
+    }), 200
+
+
+def _replay(user_id, key):
+    """Response for a sale already recorded under this key, or None."""
+    sale_id = db.session.query(Sale.id).filter(Sale.user_id == user_id, Sale.idempotency_key == key).scalar()
+    if sale_id is None:
+        return None
+    count = db.session.query(func.count(SaleItem.id)).filter(SaleItem.sale_id == sale_id).scalar()
+    return _checkout_response(sale_id, count, replayed=True)
+
+
 @api_cart_bp.route('/cart/checkout', methods=['POST'])
 @login_required
 def checkout():
-    cart = session.get('cart', [])
-    if not cart:
-        return jsonify({'error': _t('checkout_cart_empty')}), 400
     user_id = session.get('user_id')
+    key = _idempotency_key()
+    if key == '':
+        return jsonify({'error': _t('err_invalid_data')}), 400
+    if key:
+        replay = _replay(user_id, key)
+        if replay:
+            return replay
+    cart = cart_for_session(session)
+    units = cart_units(cart)
+    if not units:
+        return jsonify({'error': _t('checkout_cart_empty')}), 400
+    cart_id = cart.id
     try:
-        sale = Sale(user_id=user_id)
-        db.session.add(sale)
-        db.session.flush()
-        for item in cart:
-            si = SaleItem(sale_id=sale.id, name=item.get('name', ''), price=float(item.get('price', 0)), product_id=item.get('product_id'))
-            db.session.add(si)
+        # Everything is read above; the write transaction is one sale insert, one
+        # executemany each for the items and the rollup upsert, and the cart delete.
+        sold_at = datetime.utcnow()
+        sale_id = db.session.execute(
+            insert(Sale).values(user_id=user_id, created_at=sold_at, idempotency_key=key)
+        ).inserted_primary_key[0]
+        db.session.execute(insert(SaleItem), [
+            {'sale_id': sale_id, 'name': name or '', 'price': float(price), 'product_id': product_id}
+            for product_id, name, price in units
+        ])
+        record_sale(user_id, sold_at, units)
+        discard_cart(session)
         db.session.commit()
-        session['cart'] = []
-        return jsonify({
-            'message': _t('checkout_success'),
-            'sale_id': sale.id,
-            'items_count': len(cart),
-        }), 200
+        return _checkout_response(sale_id, len(units))
+    except IntegrityError:
+        # A concurrent submit with the same key won the race.
+        db.session.rollback()
+        session['cart_id'] = cart_id
+        replay = _replay(user_id, key) if key else None
+        if replay:
+            session.pop('cart_id', None)
+            return replay
+        return jsonify({'error': _t('checkout_error')}), 500
     except Exception as e:
         db.session.rollback()
+        session['cart_id'] = cart_id
         from flask import current_app
         current_app.logger.exception(e)
         return jsonify({'error': _t('checkout_error') + ' ' + str(e)}), 500
@@ -1,22 +1,34 @@
 """
 API controller: products (CRUD, import, QR).
 """
-import csv
-import io
 import json
 import os
 import uuid
-from flask import Blueprint, request, session, jsonify, send_file, current_app
+from flask import Blueprint, request, session, jsonify, current_app, Response, url_for
+from sqlalchemy.exc import IntegrityError
 from extensions import db
-from models import Product
+from models import Product, ImportJob, normalize_product_name
+from models.cart import cart_for_session, cart_units
+from models.catalog import product_page, PRODUCT_ROW_COLUMNS
+from models.search import search_products
 from utils.i18n import t as _t
+from utils.pagination import decode_cursor, parse_page_size, InvalidCursor
+from utils.qr import qr_payload, qr_key, qr_etag, get_qr, evict_qr, prewarm_qr
+from utils.labels import render_label_sheet, MAX_LABELS
+from utils.images import save_cover_derivatives, cover_files
+from utils.importer import IMPORT_EXTENSIONS
+from utils.import_jobs import submit_import, expire_if_stale
+from utils.export import (
+    parse_export_args, export_response, InvalidDateRange, InvalidExportFormat, EXPORT_FETCH_SIZE,
+)
 from controllers.decorators import login_required
-import qrcode
 
 api_products_bp = Blueprint('api_products', __name__, url_prefix='/api')
 
 ALLOWED_COVER_MIMETYPES = {'image/jpeg', 'image/png'}
-COVER_EXT = {'image/jpeg': '.jpg', 'image/png': '.png'}
+QR_IMMUTABLE_CACHE = 'private, max-age=31536000, immutable'
+QR_REVALIDATE_CACHE = 'private, no-cache'
+QR_MIMETYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
 
 
 def _parse_product_payload():
@@ -42,55 +54,77 @@ def _parse_product_payload():
 
 
 def _save_cover_file(product_id, file_storage):
-    """Save cover file to static/uploads; return relative path or None."""
+    """
+    Write resized WebP/JPEG cover derivatives to static/uploads; return relative path or None.
+    Each upload gets its own stem, so the files of the cover currently in the DB are never overwritten.
+    """
     if not file_storage or not file_storage.filename:
         return None
     mimetype = (file_storage.content_type or '').split(';')[0].strip().lower()
     if mimetype not in ALLOWED_COVER_MIMETYPES:
         return None
-    ext = COVER_EXT.get(mimetype, '.jpg')
     uploads_dir = os.path.join(current_app.static_folder, 'uploads')
-    os.makedirs(uploads_dir, exist_ok=True)
-    safe_name = product_id + ext
-    path = os.path.join(uploads_dir, safe_name)
-    file_storage.save(path)
-    return 'uploads/' + safe_name
+    stem = f'{product_id}-{uuid.uuid4().hex[:8]}'
+    return save_cover_derivatives(stem, file_storage.stream, uploads_dir)
 
 
 def _remove_cover_file(cover_path):
-    """Remove cover file from static/uploads if it exists."""
-    if not cover_path:
-        return
+    """Remove a cover and all of its derivatives from static/uploads."""
+    for rel in cover_files(cover_path):
+        try:
+            full = os.path.join(current_app.static_folder, rel)
+            if os.path.isfile(full):
+                os.remove(full)
+        except Exception:
+            pass
+
+
+def _name_taken(user_id, name):
+    """Index probe on (user_id, name_normalized)."""
+    q = db.session.query(Product.id).filter(
+        Product.user_id == user_id,
+        Product.name_normalized == normalize_product_name(name),
+    )
+    return q.first() is not None
+
+
+@api_products_bp.route('/products', methods=['GET'])
+@login_required
+def list_products():
+    cursor = request.args.get('cursor')
     try:
-        full = os.path.join(current_app.static_folder, cover_path)
-        if os.path.isfile(full):
-            os.remove(full)
-    except Exception:
-        pass
-
-
-def parse_import_row(row):
-    key_map = {}
-    for k in row:
-        if k is None:
-            continue
-        s = (k if isinstance(k, str) else str(k)).strip().lstrip('\ufeff')
-        if s:
-            key_map[s.lower()] = k
-    name_key = next((key_map[k] for k in ('name', 'nome', 'product', 'produto') if k in key_map), None)
-    price_key = next((key_map[k] for k in ('price', 'preco', 'preço') if k in key_map), None)
-    if not name_key or not price_key:
-        return None, None
-    name = (row.get(name_key) or '').strip()
-    if not name:
-        return None, None
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursor:
+        return jsonify({'error': _t('err_invalid_cursor')}), 400
+    products, next_cursor = product_page(after=after, limit=parse_page_size(request.args.get('limit')))
+    return jsonify({'products': products, 'next_cursor': next_cursor}), 200
+
+
+@api_products_bp.route('/products/search', methods=['GET'])
+@login_required
+def search_products_api():
+    q = (request.args.get('q') or '').strip()
+    products = search_products(q, parse_page_size(request.args.get('limit'))) if q else []
+    return jsonify({'products': products}), 200
+
+
+@api_products_bp.route('/products/export', methods=['GET'])
+@login_required
+def export_products():
     try:
-        price = float(str(row.get(price_key) or '0').replace(',', '.').strip())
-    except (TypeError, ValueError):
-        return name, None
-    if price <= 0:
-        return name, None
-    return name, round(price, 2)
+        fmt, compress, start, end = parse_export_args(request.args)
+    except InvalidExportFormat:
+        return jsonify({'error': _t('err_export_format')}), 400
+    except InvalidDateRange:
+        return jsonify({'error': _t('err_invalid_date_range')}), 400
+    q = db.session.query(*PRODUCT_ROW_COLUMNS)
+    if start:
+        q = q.filter(Product.created_at >= start)
+    if end:
+        q = q.filter(Product.created_at < end)
+    rows = q.order_by(Product.created_at, Product.id).yield_per(EXPORT_FETCH_SIZE)
+    columns = [c.key for c in PRODUCT_ROW_COLUMNS]
+    return export_response(rows, columns, fmt, compress, 'products')
 
 
 @api_products_bp.route('/products', methods=['POST'])
@@ -100,8 +134,7 @@ def add_product():
     if not name or price <= 0:
         return jsonify({'error': _t('err_invalid_name_price')}), 400
     user_id = session.get('user_id')
-    existing = Product.query.filter(Product.user_id == user_id).all()
-    if any(p.name.lower() == name.lower() for p in existing):
+    if _name_taken(user_id, name):
         return jsonify({'error': _t('err_product_already_exists')}), 409
     product_id = str(uuid.uuid4())
     cover_path = None
@@ -111,6 +144,8 @@ def add_product():
         if mimetype not in ALLOWED_COVER_MIMETYPES:
             return jsonify({'error': _t('err_cover_format')}), 400
         cover_path = _save_cover_file(product_id, cover_file)
+        if not cover_path:
+            return jsonify({'error': _t('err_cover_format')}), 400
     product = Product(
         id=product_id,
         name=name,
@@ -122,7 +157,13 @@ def add_product():
         user_id=user_id,
     )
     db.session.add(product)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        _remove_cover_file(cover_path)
+        return jsonify({'error': _t('err_product_already_exists')}), 409
+    prewarm_qr([qr_payload(product.id, product.name, product.price)])
     return jsonify(product.to_dict()), 201
 
 
@@ -135,92 +176,102 @@ def import_products():
     if not f.filename:
         return jsonify({'error': _t('import_no_file')}), 400
     fn = (f.filename or '').lower()
-    if not (fn.endswith('.csv') or fn.endswith('.json')):
+    if not fn.endswith(IMPORT_EXTENSIONS):
         return jsonify({'error': _t('import_bad_type')}), 400
-    try:
-        content = f.read()
-        if isinstance(content, bytes):
-            content = content.decode('utf-8', errors='replace')
-        if content.startswith('\ufeff'):
-            content = content[1:]
-        created = 0
-        skipped = 0
-        errors = []
-        user_id = session.get('user_id')
-        existing_names = {p.name.lower() for p in Product.query.filter(Product.user_id == user_id).all()}
-        if fn.endswith('.csv'):
-            for delimiter in (';', ','):
-                reader = csv.DictReader(io.StringIO(content), delimiter=delimiter)
-                if not reader.fieldnames or len(reader.fieldnames) < 2:
-                    continue
-                rows = list(reader)
-                if not rows:
-                    continue
-                for i, row in enumerate(rows):
-                    name, price = parse_import_row(row)
-                    if name is None and price is None:
-                        continue
-                    if price is None:
-                        errors.append(_t('import_row_invalid', row=i + 2))
-                        continue
-                    if name.lower() in existing_names:
-                        skipped += 1
-                        continue
-                    db.session.add(Product(id=str(uuid.uuid4()), name=name, price=price, user_id=user_id))
-                    created += 1
-                    existing_names.add(name.lower())
-                break
-        else:
-            data = json.loads(content)
-            if isinstance(data, dict) and 'products' in data:
-                items = data['products']
-            elif isinstance(data, list):
-                items = data
-            else:
-                return jsonify({'error': _t('import_json_format')}), 400
-            for i, item in enumerate(items):
-                if not isinstance(item, dict):
-                    errors.append(_t('import_row_invalid', row=i + 1))
-                    continue
-                name, price = parse_import_row(item)
-                if name is None and price is None:
-                    continue
-                if price is None:
-                    errors.append(_t('import_row_invalid', row=i + 1))
-                    continue
-                if name.lower() in existing_names:
-                    skipped += 1
-                    continue
-                db.session.add(Product(id=str(uuid.uuid4()), name=name, price=price, user_id=user_id))
-                created += 1
-                existing_names.add(name.lower())
-        db.session.commit()
-        msg = _t('import_success_skipped', created=created, skipped=skipped) if skipped else _t('import_success', count=created)
-        return jsonify({'message': msg, 'created': created, 'skipped': skipped, 'errors': errors[:20]}), 200
-    except json.JSONDecodeError as e:
-        return jsonify({'error': _t('import_json_invalid') + ' ' + str(e)}), 400
-    except Exception as e:
-        db.session.rollback()
-        from flask import current_app
-        current_app.logger.exception(e)
-        return jsonify({'error': _t('import_error') + ' ' + str(e)}), 500
+    job_id = submit_import(current_app._get_current_object(), f, fn, session.get('user_id'))
+    return jsonify({
+        'job_id': job_id,
+        'status': 'pending',
+        'status_url': url_for('api_products.import_status', job_id=job_id),
+        'message': _t('processing'),
+    }), 202
+
+
+@api_products_bp.route('/products/import/<job_id>', methods=['GET'])
+@login_required
+def import_status(job_id):
+    job = db.session.get(ImportJob, job_id)
+    if not job or job.user_id != session.get('user_id'):
+        return jsonify({'error': _t('import_job_not_found')}), 404
+    expire_if_stale(job)
+    out = {
+        'job_id': job.id,
+        'status': job.status,
+        'processed': job.processed,
+        'created': job.created,
+        'skipped': job.skipped,
+        'errors': [_t('import_row_invalid', row=n) for n in json.loads(job.error_rows or '[]')],
+    }
+    if job.status == 'done':
+        out['message'] = (_t('import_success_skipped', created=job.created, skipped=job.skipped) if job.skipped
+                          else _t('import_success', count=job.created))
+    elif job.status == 'failed':
+        out['error'] = (_t(job.error_key or 'import_error') + ' ' + (job.error_detail or '')).strip()
+    else:
+        out['message'] = _t('import_progress', processed=job.processed, created=job.created, skipped=job.skipped)
+    return jsonify(out), 200
 
 
 @api_products_bp.route('/products/<product_id>/qr')
 @login_required
 def get_product_qr(product_id):
-    product = Product.query.get(product_id)
-    if not product:
+    row = db.session.query(Product.id, Product.name, Product.price).filter(Product.id == product_id).first()
+    if not row:
         return jsonify({'error': _t('err_product_not_found')}), 404
-    qr_data = json.dumps({'id': product.id, 'name': product.name, 'price': product.price})
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color='black', back_color='white')
-    img_io = io.BytesIO()
-    img.save(img_io, 'PNG')
-    img_io.seek(0)
-    return send_file(img_io, mimetype='image/png')
+    fmt = 'svg' if request.args.get('format') == 'svg' else 'png'
+    payload = qr_payload(row.id, row.name, row.price)
+    etag = qr_etag(payload, fmt)
+    # ?v=<key> URLs are content-addressed: a payload change yields a new URL.
+    cache_control = QR_IMMUTABLE_CACHE if request.args.get('v') == qr_key(payload) else QR_REVALIDATE_CACHE
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(get_qr(payload, fmt), mimetype=QR_MIMETYPES[fmt])
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = cache_control
+    return resp
+
+
+@api_products_bp.route('/labels', methods=['POST'])
+@login_required
+def print_labels():
+    data = request.get_json(silent=True) or {}
+    fmt = 'png' if data.get('format') == 'png' else 'pdf'
+    if data.get('source') == 'cart':
+        items = cart_units(cart_for_session(session))
+        if not items:
+            return jsonify({'error': _t('cart_empty')}), 400
+        product_ids = [pid for pid, _, _ in items if pid]
+    else:
+        product_ids = data.get('product_ids') or []
+        if not isinstance(product_ids, list) or not all(
+            isinstance(pid, (str, int)) and not isinstance(pid, bool) for pid in product_ids
+        ):
+            return jsonify({'error': _t('err_invalid_product_ids')}), 400
+        product_ids = [str(pid) for pid in product_ids if pid]
+        items = None
+    if len(items if items is not None else product_ids) > MAX_LABELS:
+        return jsonify({'error': _t('err_too_many_labels', n=MAX_LABELS)}), 400
+    rows = {}
+    if product_ids:
+        q = db.session.query(Product.id, Product.name, Product.price).filter(Product.id.in_(set(product_ids)))
+        rows = {r.id: r for r in q}
+    if items is None:
+        items = [(pid, rows[pid].name, rows[pid].price) for pid in product_ids if pid in rows]
+    if not items:
+        return jsonify({'error': _t('select_at_least_one')}), 400
+    labels = []
+    for pid, name, price in items:
+        row = rows.get(pid)
+        labels.append({
+            'name': name,
+            'price': price,
+            'payload': qr_payload(row.id, row.name, row.price) if row else None,
+        })
+    body, mimetype, ext = render_label_sheet(labels, fmt=fmt, price_prefix=_t('currency'), no_qr_text=_t('no_qr'))
+    resp = Response(body, mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f'inline; filename=labels.{ext}'
+    return resp
 
 
 @api_products_bp.route('/products/<product_id>', methods=['PUT'])
@@ -232,19 +283,39 @@ def update_product(product_id):
     product = Product.query.get(product_id)
     if not product:
         return jsonify({'error': _t('err_product_not_found')}), 404
+    old_payload = qr_payload(product.id, product.name, product.price)
     product.name = name
     product.price = round(price, 2)
     product.grading = grading
     product.publisher = publisher
     product.year = year
+    old_cover = new_cover = None
     cover_file = request.files.get('cover')
     if cover_file and cover_file.filename:
         mimetype = (cover_file.content_type or '').split(';')[0].strip().lower()
         if mimetype not in ALLOWED_COVER_MIMETYPES:
             return jsonify({'error': _t('err_cover_format')}), 400
-        _remove_cover_file(product.cover_path)
-        product.cover_path = _save_cover_file(product_id, cover_file)
-    db.session.commit()
+        new_cover = _save_cover_file(product_id, cover_file)
+        if not new_cover:
+            db.session.rollback()
+            return jsonify({'error': _t('err_cover_format')}), 400
+        old_cover = product.cover_path
+        product.cover_path = new_cover
+    try:
+        db.session.commit()
+    except Exception as e:
+        # The row still points at the old cover: drop the new files, keep the old ones.
+        db.session.rollback()
+        _remove_cover_file(new_cover)
+        if isinstance(e, IntegrityError):
+            return jsonify({'error': _t('err_product_already_exists')}), 409
+        raise
+    if old_cover and old_cover != new_cover:
+        _remove_cover_file(old_cover)
+    new_payload = qr_payload(product.id, product.name, product.price)
+    if new_payload != old_payload:
+        evict_qr(old_payload)
+        prewarm_qr([new_payload])
     return jsonify(product.to_dict()), 200
 
 
@@ -255,6 +326,7 @@ def delete_product(product_id):
     if not product:
         return jsonify({'error': _t('err_product_not_found')}), 404
     _remove_cover_file(product.cover_path)
+    evict_qr(qr_payload(product.id, product.name, product.price))
     db.session.delete(product)
     db.session.commit()
     return jsonify({'message': _t('msg_product_deleted')}), 200
@@ -272,6 +344,7 @@ def bulk_delete_products():
     products = Product.query.filter(Product.id.in_(product_ids)).all()
     for p in products:
         _remove_cover_file(p.cover_path)
+        evict_qr(qr_payload(p.id, p.name, p.price))
         db.session.delete(p)
     db.session.commit()
     n = len(products)
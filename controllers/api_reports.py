@@ -0,0 +1,63 @@
+"""
+API controller: sales reports (daily, weekly, top products), read from the sales_rollup table.
+"""
+from datetime import date, timedelta
+from flask import Blueprint, request, session, jsonify
+from models.reports import daily_totals, weekly_totals, top_products, TOP_PRODUCTS_LIMIT
+from utils.i18n import t as _t
+from utils.export import parse_date_range, InvalidDateRange
+from utils.pagination import parse_page_size
+from controllers.decorators import login_required
+
+api_reports_bp = Blueprint('api_reports', __name__, url_prefix='/api/reports')
+
+DAILY_DEFAULT_DAYS = 30
+WEEKLY_DEFAULT_WEEKS = 12
+
+
+def _range(default_days=None):
+    """(start, end) dates from ?from=&to=, end exclusive; defaults to the last `default_days` days."""
+    start, end = parse_date_range(request.args)
+    start = start.date() if start else None
+    end = end.date() if end else None
+    if default_days and not start and not end:
+        end = date.today() + timedelta(days=1)
+        start = end - timedelta(days=default_days)
+    return start, end
+
+
+def _iso(rows, field):
+    for row in rows:
+        row[field] = row[field].isoformat()
+    return rows
+
+
+@api_reports_bp.route('/daily', methods=['GET'])
+@login_required
+def daily():
+    try:
+        start, end = _range(DAILY_DEFAULT_DAYS)
+    except InvalidDateRange:
+        return jsonify({'error': _t('err_invalid_date_range')}), 400
+    return jsonify({'days': _iso(daily_totals(session.get('user_id'), start, end), 'day')}), 200
+
+
+@api_reports_bp.route('/weekly', methods=['GET'])
+@login_required
+def weekly():
+    try:
+        start, end = _range(WEEKLY_DEFAULT_WEEKS * 7)
+    except InvalidDateRange:
+        return jsonify({'error': _t('err_invalid_date_range')}), 400
+    return jsonify({'weeks': _iso(weekly_totals(session.get('user_id'), start, end), 'week_start')}), 200
+
+
+@api_reports_bp.route('/top-products', methods=['GET'])
+@login_required
+def top():
+    try:
+        start, end = _range()
+    except InvalidDateRange:
+        return jsonify({'error': _t('err_invalid_date_range')}), 400
+    limit = parse_page_size(request.args.get('limit'), default=TOP_PRODUCTS_LIMIT)
+    return jsonify({'products': top_products(session.get('user_id'), start, end, limit)}), 200
@@ -0,0 +1,62 @@
+"""
+API controller: sales (history, export).
+"""
+from flask import Blueprint, request, session, jsonify
+from extensions import db
+from models import Sale, SaleItem
+from models.sales import sales_page
+from utils.i18n import t as _t
+from utils.pagination import decode_cursor, parse_page_size, InvalidCursor
+from utils.export import (
+    parse_export_args, export_response, InvalidDateRange, InvalidExportFormat, EXPORT_FETCH_SIZE,
+)
+from controllers.decorators import login_required
+
+api_sales_bp = Blueprint('api_sales', __name__, url_prefix='/api')
+
+SALE_EXPORT_COLUMNS = (
+    Sale.id.label('sale_id'),
+    Sale.created_at.label('sold_at'),
+    SaleItem.id.label('item_id'),
+    SaleItem.product_id,
+    SaleItem.name,
+    SaleItem.price,
+)
+
+
+@api_sales_bp.route('/sales', methods=['GET'])
+@login_required
+def list_sales():
+    cursor = request.args.get('cursor')
+    try:
+        after = decode_cursor(cursor) if cursor else None
+        sales, next_cursor = sales_page(session.get('user_id'), after=after, limit=parse_page_size(request.args.get('limit')))
+    except InvalidCursor:
+        return jsonify({'error': _t('err_invalid_cursor')}), 400
+    for s in sales:
+        s['created_at'] = s['created_at'].isoformat() if s['created_at'] else None
+    return jsonify({'sales': sales, 'next_cursor': next_cursor}), 200
+
+
+@api_sales_bp.route('/sales/export', methods=['GET'])
+@login_required
+def export_sales():
+    """One row per sale item, oldest first, for the current user's sales."""
+    try:
+        fmt, compress, start, end = parse_export_args(request.args)
+    except InvalidExportFormat:
+        return jsonify({'error': _t('err_export_format')}), 400
+    except InvalidDateRange:
+        return jsonify({'error': _t('err_invalid_date_range')}), 400
+    q = (
+        db.session.query(*SALE_EXPORT_COLUMNS)
+        .join(SaleItem, SaleItem.sale_id == Sale.id)
+        .filter(Sale.user_id == session.get('user_id'))
+    )
+    if start:
+        q = q.filter(Sale.created_at >= start)
+    if end:
+        q = q.filter(Sale.created_at < end)
+    rows = q.order_by(Sale.created_at, Sale.id, SaleItem.id).yield_per(EXPORT_FETCH_SIZE)
+    columns = [c.key for c in SALE_EXPORT_COLUMNS]
+    return export_response(rows, columns, fmt, compress, 'sales')
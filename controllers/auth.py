@@ -1,10 +1,15 @@
 """
 Auth controller: login, logout, register.
 """
+import time
+
 from flask import Blueprint, request, session, redirect, url_for, render_template, flash
 from extensions import db
-from models import User, ROLE_ADMIN
+from models import User, ROLE_ADMIN, ROLE_USER
+from models.cart import reattach_cart
+from utils.current_user import current_user_is_admin
 from utils.i18n import t as _t
+from utils.passwords import PasswordHashBusy, needs_rehash, record_login_latency
 from utils.auth_helpers import username_hash as _username_hash, email_hash as _email_hash
 from controllers.decorators import login_required, admin_required
 
@@ -16,8 +21,7 @@ def register_allowed():
         return True
     if 'user_id' not in session:
         return False
-    user = User.query.get(session['user_id'])
-    return user and user.role == ROLE_ADMIN
+    return current_user_is_admin()
 
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
@@ -56,7 +60,11 @@ def register():
         user = User()
         user.set_username(username)
         user.set_email(email)
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except PasswordHashBusy:
+            flash(_t('msg_login_busy'), 'error')
+            return render_template('register.html', is_first_user=User.query.count() == 0), 503
         user.role = ROLE_ADMIN if User.query.count() == 0 else ROLE_USER
         db.session.add(user)
         db.session.commit()
@@ -73,11 +81,23 @@ def login():
         if not username or not password:
             flash(_t('msg_enter_credentials'), 'error')
             return render_template('login.html')
-        user = User.query.filter_by(username_hash=_username_hash(username)).first()
-        if user and user.check_password(password):
+        started = time.perf_counter()
+        try:
+            user = User.query.filter_by(username_hash=_username_hash(username)).first()
+            ok = user is not None and user.check_password(password)
+            if ok and needs_rehash(user.password_hash):
+                user.set_password(password)
+                db.session.commit()
+        except PasswordHashBusy:
+            flash(_t('msg_login_busy'), 'error')
+            return render_template('login.html'), 503
+        finally:
+            record_login_latency(time.perf_counter() - started)
+        if ok:
             session['user_id'] = user.id
             session['username'] = user.username
             session['role'] = user.role
+            reattach_cart(session, user.id)
             flash(_t('msg_welcome_back', username=user.username), 'success')
             return redirect(url_for('main.index'))
         flash(_t('msg_invalid_credentials'), 'error')
@@ -3,8 +3,9 @@ Config controller: database URL, Discogs integration, erase all users.
 """
 from flask import Blueprint, request, session, redirect, url_for, flash, render_template
 from extensions import db
-from models import User, Product, Sale, SaleItem
+from models import User, Product, Sale, SaleItem, SalesRollup, Cart, CartLine, ImportJob
 from config import read_config, write_config, get_database_uri, mask_database_uri, get_discogs_credentials, is_discogs_configured
+from utils.current_user import invalidate_user
 from utils.i18n import t as _t
 from controllers.decorators import login_required, admin_required
 
@@ -84,11 +85,16 @@ def config_erase_users():
         flash(_t('config_erase_confirm_required'), 'error')
         return redirect(url_for('config.config_page'))
     try:
+        SalesRollup.query.delete()
         SaleItem.query.delete()
         Sale.query.delete()
+        CartLine.query.delete()
+        Cart.query.delete()
+        ImportJob.query.delete()
         Product.query.delete()
         User.query.delete()
         db.session.commit()
+        invalidate_user()
     except Exception as e:
         from flask import current_app
         db.session.rollback()
@@ -4,7 +4,7 @@ Auth decorators: login_required, admin_required.
 from functools import wraps
 from flask import session, redirect, url_for, flash
 
-from models import User, ROLE_ADMIN
+from utils.current_user import current_user_is_admin
 from utils.i18n import t as _t
 
 
@@ -23,8 +23,7 @@ def admin_required(f):
         if 'user_id' not in session:
             return redirect(url_for('auth.login'))
         try:
-            user = User.query.get(session['user_id'])
-            if not user or user.role != ROLE_ADMIN:
+            if not current_user_is_admin():
                 flash(_t('msg_admin_required'), 'error')
                 return redirect(url_for('pages.products'))
         except Exception:
@@ -1,42 +1,30 @@
 """
 Main controller: index, choose-language, before_request, context_processor.
 """
-import json
-from flask import Blueprint, request, redirect, url_for, render_template, session
-from translations import TRANSLATIONS, SUPPORTED_LANGS, JS_KEYS
+from flask import Blueprint, request, redirect, url_for, render_template, session, abort, Response
+from translations import TRANSLATIONS, SUPPORTED_LANGS
 
 from extensions import db
-from models import User, init_db
+from models.migrations import ensure_schema
 from config import is_ephemeral_db
-from utils.i18n import get_current_lang, t as _t
+from utils.i18n import get_current_lang, t as _t, JS_BUNDLES, js_bundle_version
+from utils.current_user import current_user_is_admin
 from controllers.decorators import login_required
 
 main_bp = Blueprint('main', __name__)
 
-_db_initialized = False
+I18N_IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
 
 
 @main_bp.before_app_request
-def before_request_db_and_cart():
-    import os
-    global _db_initialized
+def before_request_db():
     from flask import current_app
-    if not _db_initialized:
-        if os.environ.get('VERCEL') and not (os.environ.get('DATABASE_URL') or os.environ.get('POSTGRES_URL')):
-            _db_initialized = True
-        else:
-            try:
-                init_db(current_app)
-            except Exception as e:
-                current_app.logger.warning(f"init_db failed: {e}")
-            _db_initialized = True
-    if 'cart' not in session:
-        session['cart'] = []
+    ensure_schema(current_app)
 
 
 @main_bp.before_app_request
 def ensure_lang():
-    if request.endpoint in (None, 'main.choose_language', 'static', 'auth.login', 'auth.register'):
+    if request.endpoint in (None, 'main.choose_language', 'main.i18n_bundle', 'static', 'auth.login', 'auth.register'):
         return
     if session.get('lang') is None:
         return redirect(url_for('main.choose_language', next=request.url))
@@ -46,20 +34,16 @@ def ensure_lang():
 def inject_globals():
     lang = get_current_lang()
     strings = TRANSLATIONS.get(lang, TRANSLATIONS['en'])
-    js_translations = {k: strings.get(k, TRANSLATIONS['en'].get(k, k)) for k in JS_KEYS}
+    bundle_lang = lang if lang in JS_BUNDLES else 'en'
     out = {
         'use_ephemeral_db': is_ephemeral_db(),
         'strings': strings,
         'current_lang': lang,
-        'js_translations': json.dumps(js_translations),
+        'i18n_bundle_url': url_for('main.i18n_bundle', lang=bundle_lang, version=js_bundle_version(bundle_lang)),
     }
-    if 'user_id' in session:
-        try:
-            user = User.query.get(session['user_id'])
-            out['is_admin'] = user.is_admin if user else False
-        except Exception:
-            out['is_admin'] = False
-    else:
+    try:
+        out['is_admin'] = current_user_is_admin()
+    except Exception:
         out['is_admin'] = False
     return out
 
@@ -70,6 +54,17 @@ def index():
     return redirect(url_for('pages.products'))
 
 
+@main_bp.route('/i18n/<lang>.<version>.js')
+def i18n_bundle(lang, version):
+    """JS translation bundle; the URL carries a content hash, so a matching one is cached forever."""
+    if lang not in JS_BUNDLES:
+        abort(404)
+    body, current = JS_BUNDLES[lang]
+    resp = Response(body, mimetype='application/javascript')
+    resp.headers['Cache-Control'] = I18N_IMMUTABLE_CACHE if version == current else 'no-cache'
+    return resp
+
+
 @main_bp.route('/choose-language')
 def choose_language():
     lang = request.args.get('lang')
@@ -1,13 +1,30 @@
 """
 Pages controller: create product, products list, cart, users, products sold.
 """
-from flask import Blueprint, render_template, session
-from models import Product, Sale, User
+from flask import Blueprint, render_template, session, request, redirect, url_for
+from extensions import db
+from models import User
+from models.cart import cart_for_session, cart_lines, cart_summary
+from models.catalog import product_page, count_products
+from models.sales import sales_page, count_sales
+from models.search import search_products
+from utils.pagination import decode_cursor, parse_page_size, InvalidCursor
+from utils.qr import qr_payload, qr_key
+from utils.images import cover_variants
+from utils.encryption import decrypt_many
 from controllers.decorators import login_required, admin_required
 
 pages_bp = Blueprint('pages', __name__)
 
 
+def _for_listing(products_list):
+    """Add the QR URL version (payload hash) and cover derivative paths to each product dict."""
+    for p in products_list:
+        p['qr_version'] = qr_key(qr_payload(p['id'], p['name'], p['price']))
+        p['cover'] = cover_variants(p.get('cover_path'))
+    return products_list
+
+
 @pages_bp.route('/create')
 @login_required
 def create_product_page():
@@ -17,39 +34,82 @@ def create_product_page():
 @pages_bp.route('/products')
 @login_required
 def products():
-    products_list = [p.to_dict() for p in Product.query.all()]
-    return render_template('products.html', products=products_list, username=session.get('username'))
+    q = (request.args.get('q') or '').strip()
+    if q:
+        limit = parse_page_size(request.args.get('limit'))
+        return render_template(
+            'products.html',
+            products=_for_listing(search_products(q, limit)),
+            products_total=count_products(),
+            search_query=q,
+            next_cursor=None,
+            is_first_page=True,
+            page_limit=limit,
+            username=session.get('username'),
+        )
+    cursor = request.args.get('cursor')
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursor:
+        return redirect(url_for('pages.products'))
+    limit = parse_page_size(request.args.get('limit'))
+    products_list, next_cursor = product_page(after=after, limit=limit)
+    return render_template(
+        'products.html',
+        products=_for_listing(products_list),
+        products_total=count_products(),
+        next_cursor=next_cursor,
+        is_first_page=after is None,
+        page_limit=limit,
+        username=session.get('username'),
+    )
 
 
 @pages_bp.route('/cart')
 @login_required
 def cart_page():
-    cart = session.get('cart', [])
-    cart_total = sum(item['price'] for item in cart)
-    return render_template('cart.html', cart=cart, cart_total=cart_total, username=session.get('username'))
+    cart = cart_for_session(session)
+    summary = cart_summary(cart)
+    return render_template(
+        'cart.html',
+        cart=cart_lines(cart),
+        cart_id=cart.id if cart else '',
+        cart_count=summary['count'],
+        cart_total=summary['total'],
+        username=session.get('username'),
+    )
 
 
 @pages_bp.route('/users')
 @login_required
 @admin_required
 def users_page():
-    users_list = User.query.order_by(User.created_at.desc()).all()
-    users_data = [{'id': u.id, 'username': u.username, 'role': u.role, 'created_at': u.created_at} for u in users_list]
+    rows = db.session.query(User.id, User.username_enc, User.role, User.created_at).order_by(User.created_at.desc()).all()
+    usernames = decrypt_many([(r.id, r.username_enc) for r in rows])
+    users_data = [
+        {'id': r.id, 'username': name, 'role': r.role, 'created_at': r.created_at}
+        for r, name in zip(rows, usernames)
+    ]
     return render_template('users.html', users=users_data, username=session.get('username'))
 
 
 @pages_bp.route('/products-sold')
 @login_required
 def products_sold_page():
-    sales = Sale.query.filter_by(user_id=session.get('user_id')).order_by(Sale.created_at.desc()).all()
-    sales_data = []
-    for s in sales:
-        items = [{'name': i.name, 'price': i.price} for i in s.items]
-        total = sum(i.price for i in s.items)
-        sales_data.append({
-            'id': s.id,
-            'created_at': s.created_at,
-            'line_items': items,
-            'total': total,
-        })
-    return render_template('products_sold.html', sales=sales_data, username=session.get('username'))
+    user_id = session.get('user_id')
+    cursor = request.args.get('cursor')
+    limit = parse_page_size(request.args.get('limit'))
+    try:
+        after = decode_cursor(cursor) if cursor else None
+        sales_data, next_cursor = sales_page(user_id, after=after, limit=limit)
+    except InvalidCursor:
+        return redirect(url_for('pages.products_sold_page'))
+    return render_template(
+        'products_sold.html',
+        sales=sales_data,
+        sales_total=count_sales(user_id),
+        next_cursor=next_cursor,
+        is_first_page=after is None,
+        page_limit=limit,
+        username=session.get('username'),
+    )
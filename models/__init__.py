@@ -1,20 +1,23 @@
 """
-Models (M in MVC): User, Product, Sale, SaleItem, init_db.
+Models (M in MVC): User, Product, Sale, SaleItem, SalesRollup, ImportJob, Cart, CartLine, DiscogsCache, init_db.
 """
-import os
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import inspect, text
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import validates
 
 from extensions import db
-from utils.encryption import encrypt_str, decrypt_str
+from utils.encryption import encrypt_str, decrypt_identity
+from utils.passwords import hash_password, verify_password
 from utils.auth_helpers import username_hash as _username_hash, email_hash as _email_hash
 
 ROLE_USER = 'user'
 ROLE_ADMIN = 'admin'
 
 
+def normalize_product_name(name):
+    """Key for per-owner product name uniqueness (case-insensitive, trimmed)."""
+    return (name or '').strip().lower()
+
+
 class User(db.Model):
     __tablename__ = 'user'
     id = db.Column(db.Integer, primary_key=True)
@@ -32,11 +35,11 @@ class User(db.Model):
 
     @property
     def username(self):
-        return decrypt_str(self.username_enc)
+        return decrypt_identity(self.id, self.username_enc)
 
     @property
     def email(self):
-        return decrypt_str(self.email_enc)
+        return decrypt_identity(self.id, self.email_enc)
 
     def set_username(self, username):
         self.username_enc = encrypt_str(username.strip())
@@ -47,16 +50,22 @@ class User(db.Model):
         self.email_hash = _email_hash(email)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password, method='scrypt')
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 
 class Product(db.Model):
     __tablename__ = 'product'
+    __table_args__ = (
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+        db.Index('ux_product_user_name', 'user_id', 'name_normalized', unique=True),
+        db.Index('ix_product_suggested_price_at_id', 'suggested_price_at', 'id'),
+    )
     id = db.Column(db.String(36), primary_key=True)
     name = db.Column(db.String(200), nullable=False)
+    name_normalized = db.Column(db.String(200), nullable=True)
     price = db.Column(db.Float, nullable=False)
     grading = db.Column(db.String(100), nullable=True)
     publisher = db.Column(db.String(200), nullable=True)
@@ -64,6 +73,16 @@ class Product(db.Model):
     cover_path = db.Column(db.String(500), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    # Discogs marketplace price, kept current by `flask prices-refresh`
+    discogs_release_id = db.Column(db.Integer, nullable=True)
+    suggested_price = db.Column(db.Float, nullable=True)
+    suggested_currency = db.Column(db.String(3), nullable=True)
+    suggested_price_at = db.Column(db.DateTime, nullable=True)
+
+    @validates('name')
+    def _set_name_normalized(self, key, value):
+        self.name_normalized = normalize_product_name(value)
+        return value
 
     def to_dict(self):
         d = {'id': self.id, 'name': self.name, 'price': self.price}
@@ -75,97 +94,106 @@ class Product(db.Model):
             d['year'] = self.year
         if self.cover_path:
             d['cover_path'] = self.cover_path
+        if self.suggested_price is not None:
+            d['suggested_price'] = self.suggested_price
+            d['suggested_currency'] = self.suggested_currency
+            d['suggested_price_at'] = self.suggested_price_at.isoformat() if self.suggested_price_at else None
         return d
 
 
 class Sale(db.Model):
     __tablename__ = 'sale'
+    __table_args__ = (
+        db.Index('ux_sale_user_idempotency_key', 'user_id', 'idempotency_key', unique=True),
+        db.Index('ix_sale_user_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Client-generated per cart; a repeated checkout with the same key returns the original sale.
+    idempotency_key = db.Column(db.String(64), nullable=True)
     items = db.relationship('SaleItem', backref='sale', lazy=True, cascade='all, delete-orphan')
 
 
 class SaleItem(db.Model):
     __tablename__ = 'sale_item'
     id = db.Column(db.Integer, primary_key=True)
-    sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=False, index=True)
     name = db.Column(db.String(200), nullable=False)
     price = db.Column(db.Float, nullable=False)
     product_id = db.Column(db.String(36), nullable=True)
 
 
+class SalesRollup(db.Model):
+    """Units and revenue per (UTC day, seller, product); maintained at checkout, rebuilt by `flask rollups-rebuild`."""
+    __tablename__ = 'sales_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', 'product_key', name='ux_sales_rollup_user_day_product'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    # product id, or 'name:<normalized name>' for free-form items sold without a product
+    product_key = db.Column(db.String(255), nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class ImportJob(db.Model):
+    __tablename__ = 'import_job'
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    error_rows = db.Column(db.Text, nullable=True)
+    error_key = db.Column(db.String(64), nullable=True)
+    error_detail = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # heartbeat: bumped on every status change and committed batch
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+
+class Cart(db.Model):
+    """Server-side cart; only its id lives in the session. total/item_count are kept in step with the lines."""
+    __tablename__ = 'cart'
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    lines = db.relationship('CartLine', backref='cart', lazy=True, cascade='all, delete-orphan')
+
+
+class CartLine(db.Model):
+    __tablename__ = 'cart_line'
+    __table_args__ = (
+        db.Index('ix_cart_line_cart_product', 'cart_id', 'product_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.String(36), db.ForeignKey('cart.id', ondelete='CASCADE'), nullable=False)
+    product_id = db.Column(db.String(36), nullable=True)
+    name = db.Column(db.String(200), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class DiscogsCache(db.Model):
+    """Trimmed Discogs API responses (JSON) by request key; see models.discogs_cache."""
+    __tablename__ = 'discogs_cache'
+    key = db.Column(db.String(255), primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
 def init_db(app):
-    """Create tables and run migrations. Call with app context."""
+    """Create tables and apply pending migrations (see models.migrations)."""
+    from models.migrations import migrate
     with app.app_context():
-        try:
-            if os.environ.get('VERCEL') and not (os.environ.get('DATABASE_URL') or os.environ.get('POSTGRES_URL')):
-                return
-            inspector = inspect(db.engine)
-            if 'user' in inspector.get_table_names():
-                cols = {c['name'] for c in inspector.get_columns('user')}
-                if 'username' in cols and 'username_enc' not in cols:
-                    with db.engine.begin() as conn:
-                        conn.execute(text("""
-                            CREATE TABLE IF NOT EXISTS user_new (
-                                id INTEGER PRIMARY KEY,
-                                username_enc BLOB NOT NULL,
-                                username_hash VARCHAR(64) NOT NULL UNIQUE,
-                                email_enc BLOB NOT NULL,
-                                email_hash VARCHAR(64) NOT NULL UNIQUE,
-                                password_hash VARCHAR(255) NOT NULL,
-                                created_at DATETIME
-                            )
-                        """))
-                        rows = conn.execute(text(
-                            "SELECT id, username, email, password_hash, created_at FROM user"
-                        )).fetchall()
-                        for r in rows:
-                            conn.execute(text("""
-                                INSERT INTO user_new (id, username_enc, username_hash, email_enc, email_hash, password_hash, created_at)
-                                VALUES (:id, :ue, :uh, :ee, :eh, :ph, :ca)
-                            """), {
-                                'id': r[0], 'ue': encrypt_str(r[1]), 'uh': _username_hash(r[1]),
-                                'ee': encrypt_str(r[2]), 'eh': _email_hash(r[2]), 'ph': r[3], 'ca': r[4],
-                            })
-                        conn.execute(text("DROP TABLE user"))
-                        conn.execute(text("ALTER TABLE user_new RENAME TO user"))
-                        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_username_hash ON user (username_hash)"))
-                        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_email_hash ON user (email_hash)"))
-                if 'role' not in cols:
-                    try:
-                        dialect = db.engine.dialect.name
-                        table = '"user"' if dialect == 'postgresql' else 'user'
-                        with db.engine.begin() as conn:
-                            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN role VARCHAR(20) DEFAULT 'user' NOT NULL"))
-                    except Exception:
-                        pass
-        except Exception as e:
-            app.logger.warning(f"Migration check failed: {e}")
-
-        try:
-            insp = inspect(db.engine)
-            if 'product' in insp.get_table_names():
-                pcols = {c['name'] for c in insp.get_columns('product')}
-                dialect = db.engine.dialect.name
-                ptable = '"product"' if dialect == 'postgresql' else 'product'
-                with db.engine.begin() as conn:
-                    if 'grading' not in pcols:
-                        conn.execute(text(f"ALTER TABLE {ptable} ADD COLUMN grading VARCHAR(100)"))
-                    if 'publisher' not in pcols:
-                        conn.execute(text(f"ALTER TABLE {ptable} ADD COLUMN publisher VARCHAR(200)"))
-                    if 'year' not in pcols:
-                        conn.execute(text(f"ALTER TABLE {ptable} ADD COLUMN year INTEGER"))
-                    if 'cover_path' not in pcols:
-                        conn.execute(text(f"ALTER TABLE {ptable} ADD COLUMN cover_path VARCHAR(500)"))
-        except Exception as e:
-            app.logger.warning(f"Product migration check failed: {e}")
-
-        try:
-            db.create_all()
-        except OperationalError as e:
-            app.logger.warning(f"Database not available: {e}")
-            db.session.rollback()
-        except Exception as e:
-            db.session.rollback()
-            app.logger.warning(f"create_all: {e}")
+        return migrate()
@@ -0,0 +1,155 @@
+"""
+Cart store: server-side carts with quantity-aggregated lines. Only the cart id is kept in the session;
+a user's open cart is reattached at login, and carts untouched for CART_MAX_AGE are pruned by
+`flask carts-prune`.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from extensions import db
+from models import Cart, CartLine
+
+CART_MAX_AGE = timedelta(days=30)
+
+
+def line_to_dict(line):
+    return {
+        'id': line.id,
+        'product_id': line.product_id,
+        'name': line.name,
+        'price': line.price,
+        'quantity': line.quantity,
+    }
+
+
+def cart_summary(cart):
+    """O(1) view of a cart: unit count and total, read from the cart row."""
+    if cart is None:
+        return {'count': 0, 'total': 0}
+    return {'count': cart.item_count, 'total': round(cart.total, 2)}
+
+
+def load_cart(cart_id, user_id):
+    """Return the cart if it exists and belongs to user_id, else None."""
+    if not cart_id:
+        return None
+    cart = db.session.get(Cart, cart_id)
+    if cart is None or cart.user_id != user_id:
+        return None
+    return cart
+
+
+def cart_for_session(sess, create=False):
+    """
+    Resolve the cart referenced by sess['cart_id'], creating one when `create` is set.
+    A list left in sess['cart'] by the old cookie-based cart is moved into the store once.
+    """
+    user_id = sess.get('user_id')
+    cart = load_cart(sess.get('cart_id'), user_id)
+    legacy = sess.pop('cart', None) if 'cart' in sess else None
+    if cart is None and (create or legacy):
+        cart = Cart(id=str(uuid.uuid4()), user_id=user_id, item_count=0, total=0)
+        db.session.add(cart)
+        sess['cart_id'] = cart.id
+    if legacy:
+        add_items(cart, [
+            (i.get('product_id'), i.get('name', ''), float(i.get('price', 0))) for i in legacy if isinstance(i, dict)
+        ])
+        db.session.commit()
+    return cart
+
+
+def reattach_cart(sess, user_id):
+    """At login, point a session without a cart at the user's most recently updated non-empty cart."""
+    if sess.get('cart_id'):
+        return None
+    cart = Cart.query.filter(Cart.user_id == user_id, Cart.item_count > 0).order_by(Cart.updated_at.desc()).first()
+    if cart is not None:
+        sess['cart_id'] = cart.id
+    return cart
+
+
+def cart_lines(cart):
+    if cart is None:
+        return []
+    q = CartLine.query.filter(CartLine.cart_id == cart.id).order_by(CartLine.created_at, CartLine.id)
+    return [line_to_dict(line) for line in q]
+
+
+def cart_units(cart):
+    """Return [(product_id, name, price)] with each line repeated `quantity` times."""
+    if cart is None:
+        return []
+    q = db.session.query(CartLine.product_id, CartLine.name, CartLine.price, CartLine.quantity).filter(
+        CartLine.cart_id == cart.id
+    ).order_by(CartLine.created_at, CartLine.id)
+    return [(pid, name, price) for pid, name, price, qty in q for _ in range(qty)]
+
+
+def add_items(cart, items):
+    """
+    Add (product_id, name, price) items to a cart. Items with the same product (or, for free-form items,
+    the same name) and price share a line whose quantity is bumped. Existing lines are fetched with one
+    query; the cart total and count are adjusted in SQL rather than recomputed. Return the touched lines.
+    """
+    counts = {}
+    first_name = {}
+    for product_id, name, price in items:
+        key = (product_id or None, name if not product_id else None, round(float(price), 2))
+        counts[key] = counts.get(key, 0) + 1
+        first_name.setdefault(key, name)
+    if not counts:
+        return []
+    db.session.flush()
+    product_ids = {k[0] for k in counts if k[0]}
+    names = {k[1] for k in counts if k[1] is not None}
+    existing = {}
+    conds = []
+    if product_ids:
+        conds.append(CartLine.product_id.in_(product_ids))
+    if names:
+        conds.append(CartLine.product_id.is_(None) & CartLine.name.in_(names))
+    for line in CartLine.query.filter(CartLine.cart_id == cart.id, or_(*conds)):
+        key = (line.product_id, None if line.product_id else line.name, round(line.price, 2))
+        existing[key] = line
+
+    lines = []
+    delta_total = 0
+    for (product_id, name_key, price), n in counts.items():
+        line = existing.get((product_id, name_key, price))
+        if line is not None:
+            line.quantity = CartLine.quantity + n
+        else:
+            line = CartLine(
+                cart_id=cart.id, product_id=product_id, name=first_name[(product_id, name_key, price)],
+                price=price, quantity=n,
+            )
+            db.session.add(line)
+        lines.append(line)
+        delta_total += price * n
+    cart.item_count = Cart.item_count + sum(counts.values())
+    cart.total = Cart.total + delta_total
+    cart.updated_at = datetime.utcnow()
+    db.session.flush()
+    return lines
+
+
+def discard_cart(sess):
+    """Delete the session's cart and its lines with two statements, and forget its id."""
+    cart_id = sess.pop('cart_id', None)
+    sess.pop('cart', None)
+    if cart_id:
+        CartLine.query.filter(CartLine.cart_id == cart_id).delete(synchronize_session=False)
+        Cart.query.filter(Cart.id == cart_id).delete(synchronize_session=False)
+
+
+def prune_stale_carts(max_age=CART_MAX_AGE):
+    """Delete carts (and their lines) not updated for max_age, e.g. left behind by logout. Return the count."""
+    cutoff = datetime.utcnow() - max_age
+    stale = db.session.query(Cart.id).filter(Cart.updated_at < cutoff)
+    CartLine.query.filter(CartLine.cart_id.in_(stale.scalar_subquery())).delete(synchronize_session=False)
+    n = Cart.query.filter(Cart.updated_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return n
@@ -0,0 +1,67 @@
+"""
+Catalog read model: column-projected product rows and keyset-paginated listing.
+"""
+from sqlalchemy import and_, func, or_
+
+from extensions import db
+from models import Product
+from utils.pagination import encode_cursor, DEFAULT_PAGE_SIZE
+
+PRODUCT_ROW_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.price,
+    Product.grading,
+    Product.publisher,
+    Product.year,
+    Product.cover_path,
+    Product.created_at,
+    Product.suggested_price,
+    Product.suggested_currency,
+    Product.suggested_price_at,
+)
+
+
+def product_row_to_dict(row):
+    """Same shape as Product.to_dict(), built from a projected row."""
+    d = {'id': row.id, 'name': row.name, 'price': row.price}
+    if row.grading is not None:
+        d['grading'] = row.grading
+    if row.publisher is not None:
+        d['publisher'] = row.publisher
+    if row.year is not None:
+        d['year'] = row.year
+    if row.cover_path:
+        d['cover_path'] = row.cover_path
+    if row.suggested_price is not None:
+        d['suggested_price'] = row.suggested_price
+        d['suggested_currency'] = row.suggested_currency
+        at = row.suggested_price_at
+        # raw-SQL search rows carry SQLite timestamps as text
+        d['suggested_price_at'] = at.isoformat() if hasattr(at, 'isoformat') else (at or '').replace(' ', 'T') or None
+    return d
+
+
+def count_products():
+    return db.session.query(func.count(Product.id)).scalar() or 0
+
+
+def product_page(after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return (products, next_cursor) ordered newest first by (created_at, id).
+    `after` is a decoded cursor (created_at, id); next_cursor is None on the last page.
+    """
+    q = db.session.query(*PRODUCT_ROW_COLUMNS)
+    if after is not None:
+        created_at, product_id = after
+        q = q.filter(or_(
+            Product.created_at < created_at,
+            and_(Product.created_at == created_at, Product.id < product_id),
+        ))
+    rows = q.order_by(Product.created_at.desc(), Product.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return [product_row_to_dict(r) for r in rows], next_cursor
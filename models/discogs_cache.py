@@ -0,0 +1,78 @@
+"""
+Discogs response cache: trimmed JSON payloads by request key in the discogs_cache table. Freshness is
+decided by the caller (utils.discogs); this module reads, upserts and keeps the table to
+DISCOGS_CACHE_MAX_ROWS rows, dropping the least recently fetched first.
+"""
+import hashlib
+import json
+import threading
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import DiscogsCache
+
+DISCOGS_CACHE_MAX_ROWS = 20000
+EVICT_EVERY = 200
+
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def cache_key(kind, *parts):
+    raw = ':'.join(str(p) for p in parts)
+    if len(raw) > 200:
+        raw = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    return f'{kind}:{raw}'
+
+
+def get_many(keys):
+    """{key: (payload, fetched_at)} for the keys present."""
+    if not keys:
+        return {}
+    q = db.session.query(DiscogsCache.key, DiscogsCache.payload, DiscogsCache.fetched_at).filter(
+        DiscogsCache.key.in_(set(keys))
+    )
+    return {key: (json.loads(payload), fetched_at) for key, payload, fetched_at in q}
+
+
+def put_many(entries):
+    """Store {key: payload} as fetched now and commit; trims the table every EVICT_EVERY writes."""
+    global _writes
+    if not entries:
+        return
+    now = datetime.utcnow()
+    rows = [{'key': k, 'payload': json.dumps(v), 'fetched_at': now} for k, v in sorted(entries.items())]
+    table = DiscogsCache.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite_insert if dialect == 'sqlite' else pg_insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={'payload': stmt.excluded.payload, 'fetched_at': stmt.excluded.fetched_at},
+        )
+        db.session.execute(stmt, rows)
+    else:
+        for r in rows:
+            db.session.merge(DiscogsCache(**r))
+    db.session.commit()
+    with _writes_lock:
+        before = _writes
+        _writes += len(rows)
+        trim = before // EVICT_EVERY != _writes // EVICT_EVERY
+    if trim:
+        evict()
+
+
+def evict(max_rows=DISCOGS_CACHE_MAX_ROWS):
+    """Delete all but the max_rows most recently fetched entries. Return the number deleted."""
+    excess = (db.session.query(func.count(DiscogsCache.key)).scalar() or 0) - max_rows
+    if excess <= 0:
+        return 0
+    oldest = db.session.query(DiscogsCache.key).order_by(DiscogsCache.fetched_at, DiscogsCache.key).limit(excess)
+    n = DiscogsCache.query.filter(DiscogsCache.key.in_(oldest.scalar_subquery())).delete(synchronize_session=False)
+    db.session.commit()
+    return n
@@ -0,0 +1,253 @@
+"""
+Versioned schema migrations. Each step runs once per database, in order, in its own transaction, and
+bumps schema_version. Steps are written to be no-ops on schemas that already have their change (fresh
+databases get the current models from the create_tables step). Run with `flask --app app migrate`.
+"""
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import DateTime, bindparam, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import DiscogsCache, normalize_product_name
+from utils.encryption import encrypt_str
+from utils.auth_helpers import username_hash as _username_hash, email_hash as _email_hash
+
+_lock = threading.Lock()
+_checked = False
+
+
+def _table(conn, name):
+    return f'"{name}"' if conn.dialect.name == 'postgresql' else name
+
+
+def _backfill_created_at(conn, table):
+    """Set missing created_at through SQLAlchemy's DateTime so the stored text matches what keyset cursors bind."""
+    stmt = text(f"UPDATE {_table(conn, table)} SET created_at = :now WHERE created_at IS NULL")
+    conn.execute(stmt.bindparams(bindparam('now', type_=DateTime())), {'now': datetime.utcnow()})
+
+
+def _columns(conn, table):
+    insp = inspect(conn)
+    if table not in insp.get_table_names():
+        return None
+    return {c['name'] for c in insp.get_columns(table)}
+
+
+def _user_encrypted_identity(conn):
+    """Move plaintext username/email into encrypted columns plus lookup hashes (SQLite-era schema)."""
+    cols = _columns(conn, 'user')
+    if not cols or 'username' not in cols or 'username_enc' in cols:
+        return
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS user_new (
+            id INTEGER PRIMARY KEY,
+            username_enc BLOB NOT NULL,
+            username_hash VARCHAR(64) NOT NULL UNIQUE,
+            email_enc BLOB NOT NULL,
+            email_hash VARCHAR(64) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            created_at DATETIME
+        )
+    """))
+    rows = conn.execute(text("SELECT id, username, email, password_hash, created_at FROM user")).fetchall()
+    for r in rows:
+        conn.execute(text("""
+            INSERT INTO user_new (id, username_enc, username_hash, email_enc, email_hash, password_hash, created_at)
+            VALUES (:id, :ue, :uh, :ee, :eh, :ph, :ca)
+        """), {
+            'id': r[0], 'ue': encrypt_str(r[1]), 'uh': _username_hash(r[1]),
+            'ee': encrypt_str(r[2]), 'eh': _email_hash(r[2]), 'ph': r[3], 'ca': r[4],
+        })
+    conn.execute(text("DROP TABLE user"))
+    conn.execute(text("ALTER TABLE user_new RENAME TO user"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_username_hash ON user (username_hash)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_email_hash ON user (email_hash)"))
+
+
+def _user_role(conn):
+    cols = _columns(conn, 'user')
+    if cols and 'role' not in cols:
+        conn.execute(text(f"ALTER TABLE {_table(conn, 'user')} ADD COLUMN role VARCHAR(20) DEFAULT 'user' NOT NULL"))
+
+
+def _product_detail_columns(conn):
+    cols = _columns(conn, 'product')
+    if not cols:
+        return
+    ptable = _table(conn, 'product')
+    for name, ddl in (
+        ('grading', 'VARCHAR(100)'),
+        ('publisher', 'VARCHAR(200)'),
+        ('year', 'INTEGER'),
+        ('cover_path', 'VARCHAR(500)'),
+    ):
+        if name not in cols:
+            conn.execute(text(f"ALTER TABLE {ptable} ADD COLUMN {name} {ddl}"))
+
+
+def _product_created_at_index(conn):
+    if not _columns(conn, 'product'):
+        return
+    ptable = _table(conn, 'product')
+    _backfill_created_at(conn, 'product')
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_product_created_at_id ON {ptable} (created_at, id)"))
+
+
+def _product_name_normalized(conn):
+    cols = _columns(conn, 'product')
+    if not cols:
+        return
+    ptable = _table(conn, 'product')
+    if 'name_normalized' not in cols:
+        conn.execute(text(f"ALTER TABLE {ptable} ADD COLUMN name_normalized VARCHAR(200)"))
+    # Normalise in Python: SQLite's lower() only folds ASCII.
+    rows = conn.execute(text(f"SELECT id, name FROM {ptable} WHERE name_normalized IS NULL")).fetchall()
+    if rows:
+        conn.execute(
+            text(f"UPDATE {ptable} SET name_normalized = :n WHERE id = :id"),
+            [{'id': r[0], 'n': normalize_product_name(r[1])} for r in rows],
+        )
+    try:
+        with conn.begin_nested():
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS ux_product_user_name ON {ptable} (user_id, name_normalized)"
+            ))
+    except IntegrityError:
+        current_app.logger.warning("Duplicate product names per owner exist; creating non-unique name index")
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_product_user_name ON {ptable} (user_id, name_normalized)"))
+
+
+def _sale_idempotency_and_history(conn):
+    cols = _columns(conn, 'sale')
+    if cols:
+        if 'idempotency_key' not in cols:
+            conn.execute(text("ALTER TABLE sale ADD COLUMN idempotency_key VARCHAR(64)"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_sale_user_idempotency_key ON sale (user_id, idempotency_key)"
+        ))
+        _backfill_created_at(conn, 'sale')
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sale_user_created_at_id ON sale (user_id, created_at, id)"))
+    if _columns(conn, 'sale_item'):
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sale_item_sale_id ON sale_item (sale_id)"))
+
+
+def _create_tables(conn):
+    """Create tables (and their indexes) that do not exist yet; existing tables are left alone."""
+    db.metadata.create_all(conn)
+
+
+def _search_index(conn):
+    from models.search import ensure_search_index
+    ensure_search_index(conn, conn.dialect.name)
+
+
+def _sales_rollup_backfill(conn):
+    from models.reports import rebuild_rollups
+    if conn.execute(text("SELECT 1 FROM sales_rollup LIMIT 1")).first() is None:
+        rebuild_rollups(conn)
+
+
+def _discogs_cache(conn):
+    DiscogsCache.__table__.create(conn, checkfirst=True)
+
+
+def _product_suggested_price(conn):
+    cols = _columns(conn, 'product')
+    if not cols:
+        return
+    ptable = _table(conn, 'product')
+    for name, ddl in (
+        ('discogs_release_id', 'INTEGER'),
+        ('suggested_price', 'FLOAT'),
+        ('suggested_currency', 'VARCHAR(3)'),
+        ('suggested_price_at', 'TIMESTAMP'),
+    ):
+        if name not in cols:
+            conn.execute(text(f"ALTER TABLE {ptable} ADD COLUMN {name} {ddl}"))
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS ix_product_suggested_price_at_id ON {ptable} (suggested_price_at, id)"
+    ))
+
+
+# (version, name, step). Append only; never renumber or edit a released step.
+MIGRATIONS = [
+    (1, 'user_encrypted_identity', _user_encrypted_identity),
+    (2, 'user_role', _user_role),
+    (3, 'product_detail_columns', _product_detail_columns),
+    (4, 'product_created_at_index', _product_created_at_index),
+    (5, 'product_name_normalized', _product_name_normalized),
+    (6, 'sale_idempotency_and_history', _sale_idempotency_and_history),
+    (7, 'create_tables', _create_tables),
+    (8, 'search_index', _search_index),
+    (9, 'sales_rollup_backfill', _sales_rollup_backfill),
+    (10, 'discogs_cache', _discogs_cache),
+    (11, 'product_suggested_price', _product_suggested_price),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn=None):
+    """Applied version, 0 for a database that has never been migrated."""
+    conn = conn or db.session.connection()
+    if 'schema_version' not in inspect(conn).get_table_names():
+        return 0
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def migrate(log=None):
+    """Apply pending steps; return the list of (version, name) applied. Call with app context."""
+    applied = []
+    with _lock:
+        with db.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+            current = schema_version(conn)
+        for version, name, step in MIGRATIONS:
+            if version <= current:
+                continue
+            if log:
+                log(f'Applying {version:03d} {name}')
+            with db.engine.begin() as conn:
+                step(conn)
+                conn.execute(text("DELETE FROM schema_version"))
+                conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {'v': version})
+            applied.append((version, name))
+    return applied
+
+
+def ensure_schema(app):
+    """
+    Request-path check, done once per process: read schema_version and, when it is behind, migrate if
+    AUTO_MIGRATE is set (always for the throwaway SQLite database on Vercel) or log a warning otherwise.
+    A failed migration is retried on the next request.
+    """
+    global _checked
+    if _checked:
+        return
+    from config import is_ephemeral_db
+    with _lock:
+        if _checked:
+            return
+        try:
+            with db.engine.connect() as conn:
+                current = schema_version(conn)
+        except Exception as e:
+            app.logger.warning(f"Schema version check failed: {e}")
+            current = None
+        if current is None or current >= LATEST_VERSION:
+            _checked = True
+            return
+    if app.config.get('AUTO_MIGRATE') or is_ephemeral_db():
+        try:
+            migrate()
+        except Exception as e:
+            app.logger.warning(f"Migration failed: {e}")
+            return
+    else:
+        app.logger.warning(
+            f"Database schema is at version {current}, code expects {LATEST_VERSION}; "
+            "run `flask --app app migrate`."
+        )
+    _checked = True
@@ -0,0 +1,142 @@
+"""
+Sales reports: the sales_rollup table (per day, seller and product) and the queries that read it.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import Sale, SaleItem, SalesRollup, normalize_product_name
+
+TOP_PRODUCTS_LIMIT = 10
+REBUILD_BATCH_SIZE = 5000
+
+
+def rollup_key(product_id, name):
+    if product_id:
+        return str(product_id)
+    return ('name:' + normalize_product_name(name))[:255]
+
+
+def _add(out, user_id, day, product_id, name, quantity, revenue):
+    """Accumulate into out[(user_id, day, key)], keyed like the table's unique constraint."""
+    key = (user_id, day, rollup_key(product_id, name))
+    row = out.get(key)
+    if row is None:
+        row = out[key] = {
+            'user_id': user_id, 'day': day, 'product_key': key[2],
+            'name': (name or '')[:200], 'quantity': 0, 'revenue': 0.0,
+        }
+    row['quantity'] += quantity
+    row['revenue'] += float(revenue or 0)
+
+
+def _upsert(rows):
+    """Add quantity/revenue to existing rollup rows, inserting missing ones."""
+    if not rows:
+        return
+    table = SalesRollup.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite_insert if dialect == 'sqlite' else pg_insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day, table.c.product_key],
+            set_={
+                'quantity': table.c.quantity + stmt.excluded.quantity,
+                'revenue': table.c.revenue + stmt.excluded.revenue,
+                'name': stmt.excluded.name,
+            },
+        )
+        db.session.execute(stmt, rows)
+        return
+    for r in rows:
+        updated = db.session.query(SalesRollup).filter_by(
+            user_id=r['user_id'], day=r['day'], product_key=r['product_key']
+        ).update({
+            SalesRollup.quantity: SalesRollup.quantity + r['quantity'],
+            SalesRollup.revenue: SalesRollup.revenue + r['revenue'],
+            SalesRollup.name: r['name'],
+        }, synchronize_session=False)
+        if not updated:
+            db.session.execute(table.insert(), [r])
+
+
+def record_sale(user_id, sold_at, units):
+    """Add one sale's units to the rollups, inside the caller's transaction."""
+    out = {}
+    day = sold_at.date()
+    for product_id, name, price in units:
+        _add(out, user_id, day, product_id, name, 1, price)
+    # A stable row order keeps concurrent checkouts from deadlocking on each other's rows.
+    _upsert([out[k] for k in sorted(out, key=lambda k: k[2])])
+
+
+def rebuild_rollups(conn=None):
+    """Recompute every rollup row from sale/sale_item. Return the number of rows written."""
+    conn = conn or db.session
+    table = SalesRollup.__table__
+    conn.execute(table.delete())
+    day = func.date(Sale.created_at)
+    stmt = select(
+        Sale.user_id, day, SaleItem.product_id, SaleItem.name,
+        func.count(SaleItem.id), func.sum(SaleItem.price),
+    ).join(SaleItem, SaleItem.sale_id == Sale.id).group_by(
+        Sale.user_id, day, SaleItem.product_id, SaleItem.name
+    ).execution_options(yield_per=REBUILD_BATCH_SIZE)
+    out = {}
+    for user_id, d, product_id, name, n, revenue in conn.execute(stmt):
+        if isinstance(d, str):  # SQLite returns date() as text
+            d = date.fromisoformat(d)
+        if d:
+            _add(out, user_id, d, product_id, name, n, revenue)
+    rows = list(out.values())
+    for i in range(0, len(rows), REBUILD_BATCH_SIZE):
+        conn.execute(table.insert(), rows[i:i + REBUILD_BATCH_SIZE])
+    return len(rows)
+
+
+def _in_range(q, start, end):
+    if start:
+        q = q.filter(SalesRollup.day >= start)
+    if end:
+        q = q.filter(SalesRollup.day < end)
+    return q
+
+
+def daily_totals(user_id, start=None, end=None):
+    """[{'day', 'items', 'revenue'}] ordered by day; start inclusive, end exclusive (dates)."""
+    q = db.session.query(
+        SalesRollup.day, func.sum(SalesRollup.quantity), func.sum(SalesRollup.revenue)
+    ).filter(SalesRollup.user_id == user_id)
+    q = _in_range(q, start, end).group_by(SalesRollup.day).order_by(SalesRollup.day)
+    return [{'day': d, 'items': int(n or 0), 'revenue': round(r or 0, 2)} for d, n, r in q]
+
+
+def weekly_totals(user_id, start=None, end=None):
+    """Daily totals folded into ISO weeks (Monday start)."""
+    weeks = {}
+    for row in daily_totals(user_id, start, end):
+        week = row['day'] - timedelta(days=row['day'].weekday())
+        w = weeks.setdefault(week, {'week_start': week, 'items': 0, 'revenue': 0.0})
+        w['items'] += row['items']
+        w['revenue'] += row['revenue']
+    for w in weeks.values():
+        w['revenue'] = round(w['revenue'], 2)
+    return [weeks[k] for k in sorted(weeks)]
+
+
+def top_products(user_id, start=None, end=None, limit=TOP_PRODUCTS_LIMIT):
+    """Best sellers by revenue: [{'product_id', 'name', 'items', 'revenue'}]."""
+    revenue = func.sum(SalesRollup.revenue)
+    q = db.session.query(
+        SalesRollup.product_key, func.max(SalesRollup.name), func.sum(SalesRollup.quantity), revenue
+    ).filter(SalesRollup.user_id == user_id)
+    q = _in_range(q, start, end).group_by(SalesRollup.product_key).order_by(revenue.desc()).limit(limit)
+    return [{
+        'product_id': None if key.startswith('name:') else key,
+        'name': name,
+        'items': int(n or 0),
+        'revenue': round(r or 0, 2),
+    } for key, name, n, r in q]
@@ -0,0 +1,61 @@
+"""
+Sales read model: keyset-paginated history with line items eager-loaded and totals summed in SQL.
+"""
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import selectinload
+
+from extensions import db
+from models import Sale, SaleItem
+from utils.pagination import encode_cursor, InvalidCursor, DEFAULT_PAGE_SIZE
+
+
+def count_sales(user_id):
+    return db.session.query(func.count(Sale.id)).filter(Sale.user_id == user_id).scalar() or 0
+
+
+def _sale_totals(sale_ids):
+    """{sale_id: (total, item_count)} from one GROUP BY over sale_item."""
+    if not sale_ids:
+        return {}
+    q = db.session.query(SaleItem.sale_id, func.sum(SaleItem.price), func.count(SaleItem.id)).filter(
+        SaleItem.sale_id.in_(sale_ids)
+    ).group_by(SaleItem.sale_id)
+    return {sale_id: (total or 0, n) for sale_id, total, n in q}
+
+
+def sales_page(user_id, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return (sales, next_cursor) for one user, newest first by (created_at, id).
+    Items are loaded with selectinload (one extra query per page). `after` is a decoded cursor.
+    """
+    q = Sale.query.options(selectinload(Sale.items)).filter(Sale.user_id == user_id)
+    if after is not None:
+        created_at, sale_id = after
+        try:
+            sale_id = int(sale_id)
+        except (TypeError, ValueError):
+            raise InvalidCursor(sale_id)
+        q = q.filter(or_(
+            Sale.created_at < created_at,
+            and_(Sale.created_at == created_at, Sale.id < sale_id),
+        ))
+    sales = q.order_by(Sale.created_at.desc(), Sale.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(sales) > limit:
+        sales = sales[:limit]
+        next_cursor = encode_cursor(sales[-1].created_at, sales[-1].id)
+    totals = _sale_totals([s.id for s in sales])
+    out = []
+    for s in sales:
+        total, n = totals.get(s.id, (0, 0))
+        out.append({
+            'id': s.id,
+            'created_at': s.created_at,
+            'line_items': [
+                {'name': i.name, 'price': i.price, 'product_id': i.product_id}
+                for i in sorted(s.items, key=lambda i: i.id)
+            ],
+            'items_count': n,
+            'total': round(total, 2),
+        })
+    return out, next_cursor
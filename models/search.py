@@ -0,0 +1,111 @@
+"""
+Product text search: FTS5 on SQLite, generated tsvector + GIN on Postgres, LIKE fallback elsewhere.
+"""
+import re
+
+from sqlalchemy import text
+
+from extensions import db
+from models import Product
+from models.catalog import PRODUCT_ROW_COLUMNS, product_row_to_dict
+
+MAX_QUERY_TERMS = 8
+
+# External-content FTS5 table keyed on product.rowid. Product has a string primary key,
+# so rowids can be renumbered by VACUUM; run `flask search-rebuild` after one.
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        name, publisher, grading,
+        content='product', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, name, publisher, grading)
+        VALUES (new.rowid, new.name, new.publisher, new.grading);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, publisher, grading)
+        VALUES ('delete', old.rowid, old.name, old.publisher, old.grading);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, publisher, grading)
+        VALUES ('delete', old.rowid, old.name, old.publisher, old.grading);
+        INSERT INTO product_fts(rowid, name, publisher, grading)
+        VALUES (new.rowid, new.name, new.publisher, new.grading);
+    END""",
+]
+
+_POSTGRES_DDL = [
+    """ALTER TABLE "product" ADD COLUMN IF NOT EXISTS search_tsv tsvector GENERATED ALWAYS AS (
+        to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(publisher, '') || ' ' || coalesce(grading, ''))
+    ) STORED""",
+    'CREATE INDEX IF NOT EXISTS ix_product_search_tsv ON "product" USING GIN (search_tsv)',
+]
+
+_ROW_SQL = (
+    'p.id, p.name, p.price, p.grading, p.publisher, p.year, p.cover_path, p.created_at, '
+    'p.suggested_price, p.suggested_currency, p.suggested_price_at'
+)
+
+
+def ensure_search_index(conn, dialect):
+    """Create the text index and its sync triggers if missing. Call inside a transaction."""
+    if dialect == 'sqlite':
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+        )).first()
+        for stmt in _SQLITE_DDL:
+            conn.execute(text(stmt))
+        if not exists:
+            conn.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for stmt in _POSTGRES_DDL:
+            conn.execute(text(stmt))
+
+
+def rebuild_search_index():
+    """
+    Re-index every product (SQLite only; the Postgres column is maintained by the database).
+    Return False when there was nothing to rebuild.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    with db.engine.begin() as conn:
+        conn.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+    return True
+
+
+def _terms(q):
+    return re.findall(r'\w+', (q or '').lower())[:MAX_QUERY_TERMS]
+
+
+def _has_sqlite_index():
+    return db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+    )).first() is not None
+
+
+def search_products(q, limit):
+    """Return up to `limit` product dicts matching every term of q as a prefix, best match first."""
+    terms = _terms(q)
+    if not terms:
+        return []
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite' and _has_sqlite_index():
+        match = ' '.join(f'"{t}"*' for t in terms)
+        rows = db.session.execute(text(
+            f"SELECT {_ROW_SQL} FROM product_fts JOIN product p ON p.rowid = product_fts.rowid "
+            "WHERE product_fts MATCH :match ORDER BY product_fts.rank LIMIT :limit"
+        ), {'match': match, 'limit': limit}).all()
+    elif dialect == 'postgresql':
+        tsquery = ' & '.join(f'{t}:*' for t in terms)
+        rows = db.session.execute(text(
+            f"SELECT {_ROW_SQL} FROM \"product\" p, to_tsquery('simple', :q) query "
+            "WHERE p.search_tsv @@ query ORDER BY ts_rank(p.search_tsv, query) DESC, p.name LIMIT :limit"
+        ), {'q': tsquery, 'limit': limit}).all()
+    else:
+        query = db.session.query(*PRODUCT_ROW_COLUMNS)
+        for t in terms:
+            query = query.filter(Product.name.ilike(f'%{t}%'))
+        rows = query.order_by(Product.name).limit(limit).all()
+    return [product_row_to_dict(r) for r in rows]
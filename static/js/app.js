@@ -57,13 +57,28 @@ async function clearCart(){
   }catch(e){alert(t('failed'));}
 }
 
-async function finishBuy(){
+function checkoutKey(cartId){
+  // One key per server-side cart, so retries and double taps of the same cart reuse it.
+  const slot='checkoutKey:'+(cartId||'');
+  let k=sessionStorage.getItem(slot);
+  if(!k){
+    k=(window.crypto&&crypto.randomUUID)?crypto.randomUUID():Date.now().toString(36)+Math.random().toString(36).slice(2);
+    sessionStorage.setItem(slot,k);
+  }
+  return k;
+}
+
+let checkoutPending=false;
+async function finishBuy(cartId){
+  if(checkoutPending)return;
+  checkoutPending=true;
   try{
-    const r=await fetch('/api/cart/checkout',{method:'POST',headers:{'Content-Type':'application/json'}});
+    const r=await fetch('/api/cart/checkout',{method:'POST',headers:{'Content-Type':'application/json','Idempotency-Key':checkoutKey(cartId)}});
     const d=await r.json();
-    if(r.ok){alert(d.message||t('checkout_success'));window.location.href='/products-sold';}
+    if(r.ok){sessionStorage.removeItem('checkoutKey:'+(cartId||''));alert(d.message||t('checkout_success'));window.location.href='/products-sold';}
     else alert(d.error||t('failed'));
   }catch(e){alert(t('failed'));}
+  finally{checkoutPending=false;}
 }
 
 function openEditModal(id,name,price,grading,publisher,year){
@@ -118,22 +133,6 @@ async function deleteProduct(productId,productName){
   }catch(e){alert(t('failed'));}
 }
 
-function filterProductList(){
-  const q=((document.getElementById('productSearch')||{}).value||'').trim().toLowerCase();
-  const noResultsEl=document.getElementById('productsNoResults');
-  const rows=document.querySelectorAll('#productsList .product-row');
-  let visible=0;
-  rows.forEach(row=>{
-    const name=(row.querySelector('.product-name')||{}).textContent||'';
-    const match=!q||name.toLowerCase().includes(q);
-    row.style.display=match?'':'none';
-    if(match)visible++;
-  });
-  if(noResultsEl)noResultsEl.style.display=visible===0&&rows.length>0?'block':'none';
-  const sel=document.getElementById('selectAllProducts');
-  if(sel){ const visibleInputs=Array.from(rows).filter(r=>r.style.display!=='none').map(r=>r.querySelector('.product-checkbox-input')).filter(Boolean); sel.checked=visibleInputs.length>0&&visibleInputs.every(cb=>cb.checked); }
-  updateBulkDeleteButton();
-}
 function toggleSelectAll(){
   var sel=document.getElementById('selectAllProducts');
   if(!sel)return;
@@ -157,11 +156,10 @@ async function addSelectedToCart(){
   const ids=Array.from(document.querySelectorAll('.product-checkbox-input:checked')).map(c=>c.value);
   if(!ids.length){alert(t('select_at_least_one'));return;}
   try{
-    for(const productId of ids){
-      const r=await fetch('/api/cart',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({product_id:productId})});
-      if(!r.ok){alert((await r.json()).error||t('failed'));return;}
-    }
-    alert(t('msg_added_n_to_cart',{n:ids.length}));
+    const r=await fetch('/api/cart/items',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({product_ids:ids})});
+    const d=await r.json();
+    if(!r.ok){alert(d.error||t('failed'));return;}
+    alert(d.message||t('msg_added_n_to_cart',{n:d.added_count}));
     location.reload();
   }catch(e){alert(t('failed'));}
 }
@@ -176,54 +174,26 @@ async function bulkDeleteProducts(){
   }catch(e){alert(t('failed'));}
 }
 
-async function preparePrintFromCart(){
+async function printLabels(body){
+  const w=window.open('','_blank');
   try{
-    const r=await fetch('/api/cart'),d=await r.json(),cart=d.cart||[];
-    if(!cart.length){alert(t('cart_empty'));return;}
-    const items=cart.map(item=>{
-      let pid=item.product_id;
-      if(!pid){
-        document.querySelectorAll('.product-row').forEach(row=>{
-          if(row.querySelector('.product-name').textContent.trim()===item.name)
-            pid=row.getAttribute('data-product-id');
-        });
-      }
-      return{name:item.name,price:item.price,qrUrl:pid?'/api/products/'+pid+'/qr':null};
-    });
-    openPrintModal(items,t('carrinho'));
-  }catch(e){alert(t('failed'));}
+    const r=await fetch('/api/labels',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(body)});
+    if(!r.ok){if(w)w.close();alert((await r.json()).error||t('failed'));return;}
+    const url=URL.createObjectURL(await r.blob());
+    if(w)w.location.href=url;else window.location.href=url;
+  }catch(e){if(w)w.close();alert(t('failed'));}
 }
 
-async function preparePrintFromProducts(){
-  const checkboxes=document.querySelectorAll('.product-checkbox-input:checked');
-  if(!checkboxes.length){alert(t('select_at_least_one'));return;}
-  const items=Array.from(checkboxes).map(cb=>{
-    const row=cb.closest('.product-row'),name=row.querySelector('.product-name').textContent.trim(),priceText=row.querySelector('.product-price').textContent.trim(),price=parseFloat(priceText.replace(/[R$\s$]/g,'').replace(',','.'))||0;
-    return{name,price,qrUrl:'/api/products/'+cb.value+'/qr'};
-  });
-  openPrintModal(items,t('produtos_selecionados'));
-}
+function preparePrintFromCart(){printLabels({source:'cart'});}
 
-function openPrintModal(items,title){
-  const html=['<div class="print-title"><h1>'+title+'</h1><p class="print-date">'+new Date().toLocaleString()+'</p></div><div class="print-items-grid">'];
-  items.forEach(item=>{
-    const qr=item.qrUrl?'<img src="'+item.qrUrl+'" alt="QR" class="print-qr-image">':'<p class="no-qr">'+t('no_qr')+'</p>';
-    var cur=TRANSLATIONS.currency||'$';
-    html.push('<div class="print-item"><div class="print-item-header"><h3 class="print-item-name">'+escapeHtml(item.name)+'</h3><div class="print-item-price">'+cur+' '+item.price.toFixed(2).replace('.',',')+'</div></div><div class="print-item-qr">'+qr+'</div></div>');
-  });
-  const total=items.reduce((s,i)=>s+i.price,0);
-  var cur=TRANSLATIONS.currency||'$';
-  html.push('</div><div class="print-footer"><p>'+t('items')+': '+items.length+'</p><p>'+t('total')+': '+cur+' '+total.toFixed(2).replace('.',',')+'</p></div>');
-  document.getElementById('printContent').innerHTML=html.join('');
-  document.getElementById('printModal').classList.add('active');
+function preparePrintFromProducts(){
+  const ids=Array.from(document.querySelectorAll('.product-checkbox-input:checked')).map(c=>c.value);
+  if(!ids.length){alert(t('select_at_least_one'));return;}
+  printLabels({product_ids:ids});
 }
-function closePrintModal(){document.getElementById('printModal').classList.remove('active');}
-function escapeHtml(t){const d=document.createElement('div');d.textContent=t;return d.innerHTML;}
 
 var editProductModal=document.getElementById('editProductModal');
 if(editProductModal)editProductModal.addEventListener('click',e=>{if(e.target.id==='editProductModal')closeEditModal();});
-var printModal=document.getElementById('printModal');
-if(printModal)printModal.addEventListener('click',e=>{if(e.target.id==='printModal')closePrintModal();});
 
 function openScanner(){
   if(!document.getElementById('scannerModal'))return;
@@ -285,10 +255,10 @@ async function handleScannedQR(data){
   isScanning=false;
   document.getElementById('scannerStatus').textContent=t('processing');
   try{
-    const obj=JSON.parse(data);
+    const obj=data.indexOf('AP1:')===0?{code:data}:JSON.parse(data);
     const r=await fetch('/api/cart',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(obj)});
     var cur=TRANSLATIONS.currency||'$';
-    if(r.ok){document.getElementById('scannerStatus').textContent=t('added')+': '+obj.name+' - '+cur+' '+obj.price.toFixed(2).replace('.',',');setTimeout(()=>{closeScanner();location.reload();},1000);}
+    if(r.ok){const item=(await r.json()).item||obj;document.getElementById('scannerStatus').textContent=t('added')+': '+item.name+' - '+cur+' '+Number(item.price).toFixed(2).replace('.',',');setTimeout(()=>{closeScanner();location.reload();},1000);}
     else{document.getElementById('scannerStatus').textContent=t('failed');document.getElementById('scannerStatus').className='scanner-status error';setTimeout(()=>{isScanning=true;document.getElementById('scannerStatus').textContent=t('point_at_qr');},2000);}
   }catch(e){document.getElementById('scannerStatus').textContent=t('invalid_qr');document.getElementById('scannerStatus').className='scanner-status error';setTimeout(()=>{isScanning=true;document.getElementById('scannerStatus').textContent=t('point_at_qr');},2000);}
 }
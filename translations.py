@@ -70,23 +70,28 @@ TRANSLATIONS = {
         'discogs_query_too_short': 'Enter at least 2 characters to search.',
         'import_from_file': 'Import from file',
         'import_products': 'Import products',
-        'import_select_file': 'Select CSV or JSON file',
+        'import_select_file': 'Select CSV, JSON or NDJSON file',
         'import_btn': 'Import',
-        'import_format_hint': 'CSV: header row with name, price. JSON: array of { "name": "...", "price": number } or { "products": [...] }.',
+        'import_format_hint': 'CSV: header row with name, price. JSON: array of { "name": "...", "price": number } or { "products": [...] }. NDJSON: one object per line.',
         'import_success': '{count} product(s) imported.',
         'import_success_skipped': '{created} imported, {skipped} skipped (already exist).',
         'import_no_file': 'No file selected.',
-        'import_bad_type': 'File must be CSV or JSON.',
+        'import_bad_type': 'File must be CSV, JSON or NDJSON.',
         'import_empty': 'File is empty or invalid.',
         'import_json_format': 'JSON must be an array or object with "products" array.',
         'import_json_invalid': 'Invalid JSON.',
         'import_error': 'Import failed.',
         'import_row_invalid': 'Row {row}: invalid or skipped.',
+        'import_progress': 'Processing… {processed} row(s) read, {created} imported, {skipped} skipped.',
+        'import_job_not_found': 'Import job not found.',
+        'import_stalled': 'The import stopped responding and was cancelled. Please try again.',
+        'import_timeout': 'The import is taking too long. Check the product list later.',
         # Products
         'products': 'Products',
         'products_title': 'Products – AltPay Shop',
         'search_products_placeholder': 'Search products…',
         'products_no_results': 'No products match your search.',
+        'clear_search': 'Clear search',
         'select_all': 'Select all',
         'print_selected': 'Print Selected',
         'delete_selected': 'Delete Selected',
@@ -95,6 +100,8 @@ TRANSLATIONS = {
         'edit': 'Edit',
         'delete': 'Delete',
         'no_products': 'No products yet.',
+        'next_page': 'Next page',
+        'first_page': 'First page',
         'create_one': 'Create one',
         'edit_product': 'Edit Product',
         'save': 'Save',
@@ -150,6 +157,7 @@ TRANSLATIONS = {
         'msg_enter_credentials': 'Please enter both username and password.',
         'msg_welcome_back': 'Welcome back, {username}!',
         'msg_invalid_credentials': 'Invalid username or password.',
+        'msg_login_busy': 'Too many sign-ins right now. Please try again in a moment.',
         'msg_logged_out': 'You have been logged out.',
         'err_invalid_price': 'Invalid price format.',
         'err_invalid_name_price': 'Invalid name or price.',
@@ -160,6 +168,10 @@ TRANSLATIONS = {
         'err_invalid_product_ids': 'Invalid product IDs.',
         'err_no_valid_products': 'No valid products to delete.',
         'err_invalid_data': 'Invalid data.',
+        'err_invalid_cursor': 'Invalid page cursor.',
+        'err_too_many_labels': 'Too many labels; print at most {n} at once.',
+        'err_export_format': 'Unsupported export format; use csv, json or ndjson.',
+        'err_invalid_date_range': 'Invalid date range; use YYYY-MM-DD and a start before the end.',
         'msg_product_deleted': 'Product deleted.',
         'msg_products_deleted': '{n} product(s) deleted.',
         'msg_one_product_deleted': '1 product deleted.',
@@ -264,22 +276,27 @@ TRANSLATIONS = {
         'discogs_query_too_short': 'Digite pelo menos 2 caracteres para buscar.',
         'import_from_file': 'Importar de arquivo',
         'import_products': 'Importar produtos',
-        'import_select_file': 'Selecione arquivo CSV ou JSON',
+        'import_select_file': 'Selecione arquivo CSV, JSON ou NDJSON',
         'import_btn': 'Importar',
-        'import_format_hint': 'CSV: linha de cabeçalho com name, price. JSON: array de { "name": "...", "price": número } ou { "products": [...] }.',
+        'import_format_hint': 'CSV: linha de cabeçalho com name, price. JSON: array de { "name": "...", "price": número } ou { "products": [...] }. NDJSON: um objeto por linha.',
         'import_success': '{count} produto(s) importado(s).',
         'import_success_skipped': '{created} importado(s), {skipped} ignorado(s) (já existem).',
         'import_no_file': 'Nenhum arquivo selecionado.',
-        'import_bad_type': 'Arquivo deve ser CSV ou JSON.',
+        'import_bad_type': 'Arquivo deve ser CSV, JSON ou NDJSON.',
         'import_empty': 'Arquivo vazio ou inválido.',
         'import_json_format': 'JSON deve ser um array ou objeto com array "products".',
         'import_json_invalid': 'JSON inválido.',
         'import_error': 'Falha na importação.',
         'import_row_invalid': 'Linha {row}: inválida ou ignorada.',
+        'import_progress': 'Processando… {processed} linha(s) lida(s), {created} importada(s), {skipped} ignorada(s).',
+        'import_job_not_found': 'Importação não encontrada.',
+        'import_stalled': 'A importação parou de responder e foi cancelada. Tente novamente.',
+        'import_timeout': 'A importação está demorando demais. Confira a lista de produtos mais tarde.',
         'products': 'Produtos',
         'products_title': 'Produtos – AltPay Shop',
         'search_products_placeholder': 'Buscar produtos…',
         'products_no_results': 'Nenhum produto corresponde à busca.',
+        'clear_search': 'Limpar busca',
         'select_all': 'Selecionar todos',
         'print_selected': 'Imprimir selecionados',
         'delete_selected': 'Excluir selecionados',
@@ -288,6 +305,8 @@ TRANSLATIONS = {
         'edit': 'Editar',
         'delete': 'Excluir',
         'no_products': 'Nenhum produto ainda.',
+        'next_page': 'Próxima página',
+        'first_page': 'Primeira página',
         'create_one': 'Criar um',
         'edit_product': 'Editar produto',
         'save': 'Salvar',
@@ -340,6 +359,7 @@ TRANSLATIONS = {
         'msg_enter_credentials': 'Informe nome de usuário e senha.',
         'msg_welcome_back': 'Bem-vindo(a) de volta, {username}!',
         'msg_invalid_credentials': 'Nome de usuário ou senha inválidos.',
+        'msg_login_busy': 'Muitos acessos neste momento. Tente novamente em instantes.',
         'msg_logged_out': 'Você saiu da sua conta.',
         'err_invalid_price': 'Formato de preço inválido.',
         'err_invalid_name_price': 'Nome ou preço inválido.',
@@ -350,6 +370,10 @@ TRANSLATIONS = {
         'err_invalid_product_ids': 'IDs de produto inválidos.',
         'err_no_valid_products': 'Nenhum produto válido para excluir.',
         'err_invalid_data': 'Dados inválidos.',
+        'err_invalid_cursor': 'Cursor de página inválido.',
+        'err_too_many_labels': 'Etiquetas demais; imprima no máximo {n} de cada vez.',
+        'err_export_format': 'Formato de exportação não suportado; use csv, json ou ndjson.',
+        'err_invalid_date_range': 'Intervalo de datas inválido; use AAAA-MM-DD e um início anterior ao fim.',
         'msg_product_deleted': 'Produto excluído.',
         'msg_products_deleted': '{n} produto(s) excluído(s).',
         'msg_one_product_deleted': '1 produto excluído.',
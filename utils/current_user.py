@@ -0,0 +1,64 @@
+"""
+Current user lookups: the role is memoised on `g` for the request and in a small per-process TTL cache
+across requests. Entries are dropped when a User row changes; other workers see the change within the TTL.
+"""
+import threading
+import time
+
+from flask import g, session
+from sqlalchemy import event
+
+from extensions import db
+from models import User, ROLE_ADMIN
+
+ROLE_CACHE_TTL = 60  # seconds
+ROLE_CACHE_SIZE = 1024
+
+_roles = {}  # user_id -> (role or None, expires_at)
+_lock = threading.Lock()
+_MISSING = object()
+
+
+def _cached_role(user_id):
+    now = time.monotonic()
+    with _lock:
+        hit = _roles.get(user_id)
+        if hit and hit[1] > now:
+            return hit[0]
+    role = db.session.query(User.role).filter(User.id == user_id).scalar()
+    with _lock:
+        if len(_roles) >= ROLE_CACHE_SIZE:
+            for uid in [uid for uid, (_, exp) in _roles.items() if exp <= now] or list(_roles)[:ROLE_CACHE_SIZE // 4]:
+                _roles.pop(uid, None)
+        _roles[user_id] = (role, now + ROLE_CACHE_TTL)
+    return role
+
+
+def current_user_role():
+    """Role of the logged-in user, or None when logged out or the user no longer exists."""
+    role = g.get('_current_user_role', _MISSING)
+    if role is _MISSING:
+        user_id = session.get('user_id')
+        role = _cached_role(user_id) if user_id is not None else None
+        g._current_user_role = role
+    return role
+
+
+def current_user_is_admin():
+    return current_user_role() == ROLE_ADMIN
+
+
+def invalidate_user(user_id=None):
+    """Forget one user's cached role, or every entry when user_id is None."""
+    with _lock:
+        if user_id is None:
+            _roles.clear()
+        else:
+            _roles.pop(user_id, None)
+    g.pop('_current_user_role', None)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _on_user_change(mapper, connection, target):
+    invalidate_user(target.id)
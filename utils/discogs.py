@@ -0,0 +1,344 @@
+"""
+Discogs API client: keep-alive HTTPS connections to api.discogs.com reused from a small pool, and price
+suggestions whose release lookups run concurrently under one overall deadline. Search results and
+release prices are cached in the discogs_cache table: served directly while fresh, served and refreshed
+in the background while stale, fetched when missing or expired. Every response feeds the shared
+rate limiter from its X-Discogs-Ratelimit-* headers; batch jobs wait on it before each request.
+"""
+import http.client
+import json
+import logging
+import ssl
+import threading
+import time
+import urllib.parse
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import get_discogs_credentials
+from extensions import db
+from models.discogs_cache import cache_key, get_many, put_many
+
+DISCOGS_HOST = 'api.discogs.com'
+USER_AGENT = 'AltPayShop/1.0 +https://github.com/altpay'
+DISCOGS_POOL_SIZE = 6
+REQUEST_TIMEOUT = 10
+SUGGESTION_DEADLINE = 8.0
+SUGGESTION_RELEASES = 6
+SEARCH_TTL = timedelta(hours=24)
+RELEASE_TTL = timedelta(hours=6)
+# How long past its TTL an entry may still be served while a refresh runs.
+STALE_TTL = timedelta(days=7)
+# Requests per minute assumed until Discogs reports its limit (60 authenticated).
+DISCOGS_RATE_LIMIT = 60
+# Share of the per-minute quota throttled callers leave for interactive lookups.
+DISCOGS_RATE_RESERVE = 5
+
+logger = logging.getLogger(__name__)
+
+
+class DiscogsError(Exception):
+    """Transport failure or non-2xx answer from Discogs (`status` is the HTTP status, if any)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class RateLimiter:
+    """
+    Token bucket refilled at limit/60 tokens per second, holding at most limit - reserve tokens. The limit
+    and the tokens left follow the X-Discogs-Ratelimit and -Remaining headers of every response, so
+    requests made by other callers sharing the quota are accounted for.
+    """
+
+    def __init__(self, limit=DISCOGS_RATE_LIMIT, reserve=DISCOGS_RATE_RESERVE):
+        self.limit = limit
+        self.reserve = reserve
+        self.tokens = float(self._capacity())
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _capacity(self):
+        return max(1, self.limit - self.reserve)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self._capacity(), self.tokens + (now - self._updated) * self.limit / 60.0)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_s = (1 - self.tokens) * 60.0 / self.limit
+            time.sleep(wait_s)
+
+    def observe(self, headers):
+        try:
+            limit = int(headers.get('X-Discogs-Ratelimit') or 0)
+            remaining = headers.get('X-Discogs-Ratelimit-Remaining')
+            remaining = int(remaining) if remaining is not None else None
+        except ValueError:
+            return
+        with self._lock:
+            self._refill()
+            if limit > 0:
+                self.limit = limit
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining - self.reserve)
+
+    def throttled(self):
+        """A 429 came back: empty the bucket and leave about five seconds of refill before the next request."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0) - self.limit / 12.0
+
+
+class ConnectionPool:
+    """
+    Up to `size` persistent HTTPSConnections to one host. A connection found dead on reuse (the server
+    closed an idle keep-alive) is reopened and the request retried once.
+    """
+
+    def __init__(self, host, size):
+        self.host = host
+        self._ssl = ssl.create_default_context()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _checkout(self, timeout):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return http.client.HTTPSConnection(self.host, timeout=timeout, context=self._ssl), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def get(self, path, headers, timeout):
+        """Return (status, headers, body bytes)."""
+        if not self._slots.acquire(timeout=timeout):
+            raise DiscogsError('connection pool exhausted')
+        try:
+            conn, reused = self._checkout(timeout)
+            while True:
+                try:
+                    conn.request('GET', path, headers=headers)
+                    resp = conn.getresponse()
+                    body = resp.read()
+                except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionError) as e:
+                    conn.close()
+                    if not reused:
+                        raise DiscogsError(str(e)) from e
+                    reused = False
+                    continue
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    raise DiscogsError(str(e)) from e
+                with self._lock:
+                    self._idle.append(conn)
+                return resp.status, resp.headers, body
+        finally:
+            self._slots.release()
+
+
+_pool = ConnectionPool(DISCOGS_HOST, DISCOGS_POOL_SIZE)
+rate_limiter = RateLimiter()
+_executor = ThreadPoolExecutor(max_workers=DISCOGS_POOL_SIZE, thread_name_prefix='discogs')
+_refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='discogs-refresh')
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def auth_headers():
+    token, key, secret = get_discogs_credentials()
+    headers = {'User-Agent': USER_AGENT, 'Accept': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Discogs token={token}'
+    elif key and secret:
+        headers['Authorization'] = f'Discogs key={key}, secret={secret}'
+    return headers
+
+
+def discogs_get(path, params=None, headers=None, timeout=REQUEST_TIMEOUT, throttle=False):
+    """
+    GET a Discogs API path and return the decoded JSON. Raise DiscogsError on failure.
+    With `throttle`, wait for the rate limiter first (batch jobs); interactive lookups don't wait.
+    """
+    if params:
+        path += '?' + urllib.parse.urlencode(params)
+    if throttle:
+        rate_limiter.acquire()
+    status, resp_headers, body = _pool.get(path, headers or auth_headers(), timeout)
+    rate_limiter.observe(resp_headers)
+    if status == 429:
+        rate_limiter.throttled()
+    if not 200 <= status < 300:
+        raise DiscogsError(f'HTTP {status} for {path}', status)
+    try:
+        return json.loads(body.decode('utf-8'))
+    except ValueError as e:
+        raise DiscogsError(f'invalid JSON for {path}') from e
+
+
+def discogs_request(path, params=None, timeout=REQUEST_TIMEOUT):
+    """Like discogs_get, but log failures and return None."""
+    try:
+        return discogs_get(path, params, timeout=timeout)
+    except DiscogsError as e:
+        logger.warning('Discogs request failed: %s', e)
+        return None
+
+
+def release_price(release, curr):
+    """(price, currency) from a /releases/{id} payload; price is None when there is no listing."""
+    low = release.get('lowest_price')
+    price = None
+    if low is not None:
+        try:
+            price = float(low['value'] if isinstance(low, dict) else low)
+        except (TypeError, ValueError, KeyError):
+            pass
+    curr_code = low.get('currency') if isinstance(low, dict) else release.get('currency', curr)
+    return (round(price, 2) if price is not None else None), curr_code or curr
+
+
+# One cacheable GET: cache key, API path and params, payload trimmer and freshness TTL.
+_Spec = namedtuple('_Spec', 'key path params trim ttl')
+
+
+def _trim_search(data):
+    return {'results': [{'id': r.get('id'), 'title': r.get('title', '')} for r in (data.get('results') or [])]}
+
+
+def _trim_release(data):
+    return {k: data.get(k) for k in ('lowest_price', 'currency', 'num_for_sale')}
+
+
+def search_spec(q):
+    return _Spec(cache_key('search', ' '.join(q.lower().split())), '/database/search',
+                 {'q': q, 'type': 'release', 'per_page': 8}, _trim_search, SEARCH_TTL)
+
+
+def release_spec(release_id, curr):
+    return _Spec(cache_key('release', release_id, curr), f'/releases/{release_id}', {'curr_abbr': curr},
+                 _trim_release, RELEASE_TTL)
+
+
+def _cache_lookup(specs):
+    """Return ({key: payload} usable now, [stale specs], [missing or expired specs])."""
+    try:
+        entries = get_many([s.key for s in specs])
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.warning('Discogs cache unavailable: %s', e)
+        entries = {}
+    now = datetime.utcnow()
+    hits, stale, missing = {}, [], []
+    for spec in specs:
+        entry = entries.get(spec.key)
+        if entry is None or now - entry[1] >= spec.ttl + STALE_TTL:
+            missing.append(spec)
+            continue
+        hits[spec.key] = entry[0]
+        if now - entry[1] >= spec.ttl:
+            stale.append(spec)
+    return hits, stale, missing
+
+
+def _cache_store(entries):
+    try:
+        put_many(entries)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.warning('Discogs cache write failed: %s', e)
+
+
+def _revalidate(specs, headers):
+    """Queue stale specs for the background refresher; a key already queued is not queued again."""
+    with _refreshing_lock:
+        specs = [s for s in specs if s.key not in _refreshing]
+        _refreshing.update(s.key for s in specs)
+    if specs:
+        _refresher.submit(_refresh, current_app._get_current_object(), specs, headers)
+
+
+def _refresh(app, specs, headers):
+    try:
+        with app.app_context():
+            fresh = {}
+            for spec in specs:
+                try:
+                    fresh[spec.key] = spec.trim(discogs_get(spec.path, spec.params, headers))
+                except DiscogsError as e:
+                    logger.warning('Discogs refresh of %s failed: %s', spec.key, e)
+            _cache_store(fresh)
+    finally:
+        with _refreshing_lock:
+            _refreshing.difference_update(s.key for s in specs)
+
+
+def cached_get(spec, headers=None, timeout=REQUEST_TIMEOUT, allow_stale=True, throttle=False):
+    """
+    Trimmed payload for one spec through the cache. Raise DiscogsError when it must be fetched and can't.
+    Without `allow_stale`, a stale entry is refetched now instead of in the background.
+    """
+    headers = headers or auth_headers()
+    hits, stale, missing = _cache_lookup([spec])
+    if stale and allow_stale:
+        _revalidate(stale, headers)
+    if not missing and not (stale and not allow_stale):
+        return hits[spec.key]
+    payload = spec.trim(discogs_get(spec.path, spec.params, headers, timeout, throttle))
+    _cache_store({spec.key: payload})
+    return payload
+
+
+def price_suggestions(q, curr, limit=SUGGESTION_RELEASES, deadline=SUGGESTION_DEADLINE):
+    """
+    Search releases for `q` and look up marketplace prices of the first `limit`; cache misses are fetched
+    concurrently. Return (suggestions, partial): lookups still running at the deadline have price None.
+    """
+    end = time.monotonic() + deadline
+    headers = auth_headers()
+    try:
+        search = cached_get(search_spec(q), headers, timeout=min(REQUEST_TIMEOUT, deadline))
+    except DiscogsError as e:
+        logger.warning('Discogs search failed: %s', e)
+        return [], False
+    results = [r for r in search['results'][:limit] if r.get('id')]
+    specs = [release_spec(r['id'], curr) for r in results]
+    releases, stale, missing = _cache_lookup(specs)
+    if stale:
+        _revalidate(stale, headers)
+    timeout = max(0.1, min(REQUEST_TIMEOUT, end - time.monotonic()))
+    futures = {s.key: _executor.submit(discogs_get, s.path, s.params, headers, timeout) for s in missing}
+    done, not_done = wait(futures.values(), timeout=max(0, end - time.monotonic()))
+    for f in not_done:
+        f.cancel()
+    fetched = {}
+    for key, f in futures.items():
+        if f in done:
+            try:
+                fetched[key] = _trim_release(f.result())
+            except DiscogsError as e:
+                logger.warning('Discogs lookup %s failed: %s', key, e)
+    _cache_store(fetched)
+    releases.update(fetched)
+    suggestions = []
+    for r, spec in zip(results, specs):
+        release = releases.get(spec.key)
+        price, currency = release_price(release, curr) if release is not None else (None, curr)
+        suggestions.append({'title': r.get('title', ''), 'price': price, 'currency': currency, 'release_id': r['id']})
+    return suggestions, bool(not_done)
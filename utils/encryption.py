@@ -1,8 +1,14 @@
 """
-Fernet encryption for usernames/emails. Uses APP_ENCRYPTION_KEY or instance/fernet.key.
+Fernet encryption for usernames/emails. Uses APP_ENCRYPTION_KEY or instance/fernet.key; extra keys
+are accepted for decryption so the primary can be rotated (see `flask reencrypt-users`).
+Decrypted identity fields are memoised in a bounded LRU keyed by (user id, ciphertext digest).
 """
+import hashlib
 import os
-from cryptography.fernet import Fernet
+import threading
+from collections import OrderedDict
+
+from cryptography.fernet import Fernet, MultiFernet
 
 from config import basedir
 
@@ -14,20 +20,39 @@ def get_instance_key_path():
     return os.path.join(instance_dir, 'fernet.key')
 
 
-def get_fernet():
+def _split_keys(raw):
+    return [k.strip() for k in raw.replace('\n', ',').split(',') if k.strip()]
+
+
+def get_encryption_keys():
+    """
+    Fernet keys, primary first. APP_ENCRYPTION_KEY may list several comma-separated keys and
+    APP_ENCRYPTION_OLD_KEYS adds read-only ones; locally, each line of instance/fernet.key is a key.
+    """
     env_key = os.environ.get('APP_ENCRYPTION_KEY')
     if env_key:
-        return Fernet(env_key.encode('utf-8'))
+        return _split_keys(env_key) + _split_keys(os.environ.get('APP_ENCRYPTION_OLD_KEYS', ''))
     if os.environ.get('VERCEL'):
         raise RuntimeError('Missing APP_ENCRYPTION_KEY. Set it in Vercel environment variables.')
     key_path = get_instance_key_path()
     if os.path.exists(key_path):
-        with open(key_path, 'rb') as f:
-            return Fernet(f.read().strip())
+        with open(key_path, 'r', encoding='ascii') as f:
+            keys = _split_keys(f.read())
+        if keys:
+            return keys
     key = Fernet.generate_key()
     with open(key_path, 'wb') as f:
         f.write(key)
-    return Fernet(key)
+    return [key.decode('ascii')]
+
+
+def fernet_from_keys(keys):
+    """MultiFernet: encrypts with keys[0], decrypts with any of them."""
+    return MultiFernet([Fernet(k.encode('ascii') if isinstance(k, str) else k) for k in keys])
+
+
+def get_fernet():
+    return fernet_from_keys(get_encryption_keys())
 
 
 _fernet = None
@@ -40,9 +65,63 @@ def _get_fernet():
     return _fernet
 
 
+def primary_key_id():
+    """Short fingerprint of the primary key, used to tag re-encryption progress."""
+    return hashlib.sha256(get_encryption_keys()[0].encode('ascii')).hexdigest()[:12]
+
+
 def encrypt_str(value):
     return _get_fernet().encrypt(value.encode('utf-8'))
 
 
 def decrypt_str(token):
     return _get_fernet().decrypt(token).decode('utf-8')
+
+
+def rotate_token(token):
+    """Re-encrypt a token under the primary key (it may have been written with any configured key)."""
+    return _get_fernet().rotate(bytes(token))
+
+
+IDENTITY_CACHE_SIZE = 4096
+
+_identity_cache = OrderedDict()
+_identity_lock = threading.Lock()
+
+
+def _cache_key(user_id, token):
+    # A changed or re-encrypted value has a new digest, so stale entries are never returned.
+    return user_id, hashlib.blake2b(bytes(token), digest_size=16).digest()
+
+
+def decrypt_identity(user_id, token):
+    """decrypt_str() through the identity cache; uncached when user_id is None (row not flushed yet)."""
+    if user_id is None:
+        return decrypt_str(token)
+    return decrypt_many([(user_id, token)])[0]
+
+
+def decrypt_many(pairs):
+    """Decrypt [(user_id, token)] in order, taking the lock once for lookups and once for inserts."""
+    keys = [_cache_key(uid, token) for uid, token in pairs]
+    out = [None] * len(keys)
+    misses = []
+    with _identity_lock:
+        for i, key in enumerate(keys):
+            value = _identity_cache.get(key)
+            if value is None:
+                misses.append(i)
+            else:
+                _identity_cache.move_to_end(key)
+                out[i] = value
+    if not misses:
+        return out
+    for i in misses:
+        out[i] = decrypt_str(pairs[i][1])
+    with _identity_lock:
+        for i in misses:
+            _identity_cache[keys[i]] = out[i]
+            _identity_cache.move_to_end(keys[i])
+        while len(_identity_cache) > IDENTITY_CACHE_SIZE:
+            _identity_cache.popitem(last=False)
+    return out
@@ -0,0 +1,133 @@
+"""
+Streaming export: serialise query rows to CSV / JSON / NDJSON chunks, optionally gzip-compressed.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+
+from flask import Response, stream_with_context
+
+EXPORT_FORMATS = ('csv', 'json', 'ndjson')
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',  # Werkzeug appends '; charset=utf-8' to text/* mimetypes
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+# Rows fetched per round trip from the server-side cursor.
+EXPORT_FETCH_SIZE = 2000
+# Serialised bytes buffered before a chunk is sent.
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+class InvalidDateRange(ValueError):
+    pass
+
+
+class InvalidExportFormat(ValueError):
+    pass
+
+
+def _parse_day(value):
+    try:
+        return date.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        raise InvalidDateRange(value)
+
+
+def parse_date_range(args):
+    """
+    Read ?from=YYYY-MM-DD&to=YYYY-MM-DD (both optional, inclusive).
+    Return (start, end) datetimes as a half-open range [start, end); raise InvalidDateRange.
+    """
+    start = end = None
+    if args.get('from'):
+        start = datetime.combine(_parse_day(args['from']), datetime.min.time())
+    if args.get('to'):
+        end = datetime.combine(_parse_day(args['to']) + timedelta(days=1), datetime.min.time())
+    if start and end and start >= end:
+        raise InvalidDateRange(args.get('to'))
+    return start, end
+
+
+def parse_export_args(args):
+    """Return (fmt, compress, start, end) from ?format=&gzip=&from=&to=."""
+    fmt = (args.get('format') or 'csv').strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        raise InvalidExportFormat(fmt)
+    compress = (args.get('gzip') or '').lower() in ('1', 'true', 'yes')
+    start, end = parse_date_range(args)
+    return fmt, compress, start, end
+
+
+def _value(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+def _serialise(rows, columns, fmt):
+    """Yield text pieces for rows (tuples in `columns` order)."""
+    if fmt == 'csv':
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(['' if v is None else _value(v) for v in row])
+            if buf.tell() >= EXPORT_CHUNK_SIZE:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+        return
+    if fmt == 'ndjson':
+        for row in rows:
+            yield json.dumps({c: _value(v) for c, v in zip(columns, row)}, ensure_ascii=False) + '\n'
+        return
+    yield '['
+    sep = ''
+    for row in rows:
+        yield sep + json.dumps({c: _value(v) for c, v in zip(columns, row)}, ensure_ascii=False)
+        sep = ','
+    yield ']\n'
+
+
+def _chunks(pieces):
+    """Coalesce small text pieces into ~EXPORT_CHUNK_SIZE byte chunks."""
+    parts, size = [], 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def stream_export(rows, columns, fmt='csv', compress=False):
+    """Return a generator of byte chunks for `rows`; memory use does not grow with the row count."""
+    chunks = _chunks(_serialise(rows, columns, fmt))
+    return _gzip(chunks) if compress else chunks
+
+
+def export_response(rows, columns, fmt, compress, basename):
+    """Chunked download response; `rows` is iterated lazily while the request context stays open."""
+    ext = fmt + ('.gz' if compress else '')
+    mimetype = 'application/gzip' if compress else EXPORT_MIMETYPES[fmt]
+    resp = Response(stream_with_context(stream_export(rows, columns, fmt, compress)), mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f'attachment; filename="{basename}-{date.today().isoformat()}.{ext}"'
+    resp.headers['Cache-Control'] = 'no-store'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
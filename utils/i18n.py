@@ -1,9 +1,12 @@
 """
-i18n helpers: current language and translated strings.
+i18n helpers: current language, translated strings and the per-language JS bundles.
 """
+import hashlib
+import json
+
 from flask import session
 
-from translations import TRANSLATIONS, JS_KEYS
+from translations import TRANSLATIONS, SUPPORTED_LANGS, JS_KEYS
 
 
 def get_current_lang():
@@ -17,3 +20,18 @@ def t(key, **kwargs):
     if kwargs:
         s = s.format(**kwargs)
     return s
+
+
+def _build_js_bundle(lang):
+    strings = TRANSLATIONS.get(lang, TRANSLATIONS['en'])
+    subset = {k: strings.get(k, TRANSLATIONS['en'].get(k, k)) for k in JS_KEYS}
+    body = 'window.TRANSLATIONS = %s;\n' % json.dumps(subset, ensure_ascii=False, sort_keys=True)
+    return body, hashlib.sha256(body.encode('utf-8')).hexdigest()[:12]
+
+
+# lang -> (javascript source, content hash); built once at import, served from memory.
+JS_BUNDLES = {lang: _build_js_bundle(lang) for lang in SUPPORTED_LANGS}
+
+
+def js_bundle_version(lang):
+    return JS_BUNDLES.get(lang, JS_BUNDLES['en'])[1]
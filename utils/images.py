@@ -0,0 +1,70 @@
+"""
+Cover image derivatives: EXIF-normalised, size-capped WebP + JPEG renditions written at upload time.
+"""
+import os
+import re
+
+from PIL import Image, ImageOps
+
+COVER_MAX_DIMENSION = 2000
+# name -> longest edge in px; 'thumb' covers the 48px list cell at up to 3x density.
+COVER_SIZES = {'thumb': 160, 'detail': 800}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+_DERIVED_RE = re.compile(r'^(?P<stem>.+)-detail\.jpg$')
+
+
+def _load(source):
+    img = Image.open(source)
+    # Let the JPEG decoder downscale by a power of two while reading.
+    img.draft('RGB', (COVER_MAX_DIMENSION, COVER_MAX_DIMENSION))
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, 'white')
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail((COVER_MAX_DIMENSION, COVER_MAX_DIMENSION), Image.LANCZOS)
+    return img
+
+
+def save_cover_derivatives(stem, source, uploads_dir):
+    """
+    Write <stem>-<size>.webp/.jpg for each COVER_SIZES entry into uploads_dir.
+    Metadata is not copied, so EXIF (GPS, camera) is stripped. Return the
+    relative cover_path ('uploads/<stem>-detail.jpg') or None if source is not a readable image.
+    """
+    try:
+        img = _load(source)
+    except Exception:
+        return None
+    os.makedirs(uploads_dir, exist_ok=True)
+    for size_name, edge in COVER_SIZES.items():
+        rendition = img.copy()
+        rendition.thumbnail((edge, edge), Image.LANCZOS)
+        base = os.path.join(uploads_dir, f'{stem}-{size_name}')
+        rendition.save(base + '.webp', 'WEBP', quality=WEBP_QUALITY, method=4)
+        rendition.save(base + '.jpg', 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return f'uploads/{stem}-detail.jpg'
+
+
+def cover_variants(cover_path):
+    """Return {'<size>_<ext>': relative path} for a derived cover, or None for a legacy single file."""
+    if not cover_path:
+        return None
+    m = _DERIVED_RE.match(cover_path)
+    if not m:
+        return None
+    stem = m.group('stem')
+    return {f'{size}_{ext}': f'{stem}-{size}.{ext}' for size in COVER_SIZES for ext in ('webp', 'jpg')}
+
+
+def cover_files(cover_path):
+    """All relative paths belonging to a cover (every derivative, or the single legacy file)."""
+    variants = cover_variants(cover_path)
+    if variants:
+        return list(variants.values())
+    return [cover_path] if cover_path else []
@@ -0,0 +1,107 @@
+"""
+Background product import jobs: the upload is spooled to instance/imports and processed on a worker thread.
+Uploads up to IMPORT_INLINE_MAX_BYTES, and every upload on Vercel (where the function is frozen once the
+response is sent), are processed before the request returns instead. Progress is committed to the import_job table after every batch so any worker can report it; a job whose
+heartbeat (updated_at) is older than IMPORT_STALE_AFTER is reported as failed, since its thread is gone.
+"""
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config import get_instance_dir
+from extensions import db
+from models import ImportJob
+from utils.importer import import_products, ImportFormatError, IMPORT_BATCH_SIZE
+from utils.qr import prewarm_qr
+
+IMPORT_WORKERS = 2
+IMPORT_INLINE_MAX_BYTES = 256 * 1024
+# Longer than any batch takes; covers worker restarts, redeploys and frozen serverless instances.
+IMPORT_STALE_AFTER = timedelta(minutes=10)
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import')
+
+
+def _upload_dir():
+    path = os.path.join(get_instance_dir(), 'imports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def expire_if_stale(job):
+    """Mark a pending/running job failed when its heartbeat is older than IMPORT_STALE_AFTER. Return True if so."""
+    if job.status not in ('pending', 'running'):
+        return False
+    if (job.updated_at or job.created_at) > datetime.utcnow() - IMPORT_STALE_AFTER:
+        return False
+    job.status, job.error_key, job.error_detail = 'failed', 'import_stalled', None
+    job.finished_at = job.updated_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def submit_import(app, file_storage, filename, user_id):
+    """Save the upload, record a pending job and queue it (or run it now; see above). Return the job id."""
+    job_id = str(uuid.uuid4())
+    path = os.path.join(_upload_dir(), job_id + os.path.splitext(filename)[1])
+    file_storage.save(path)
+    db.session.add(ImportJob(id=job_id, user_id=user_id, filename=filename))
+    db.session.commit()
+    inline_max = app.config.get('IMPORT_INLINE_MAX_BYTES', IMPORT_INLINE_MAX_BYTES)
+    if os.environ.get('VERCEL') or os.path.getsize(path) <= inline_max:
+        _run(app, job_id, path)
+    else:
+        _executor.submit(_run, app, job_id, path)
+    return job_id
+
+
+def _run(app, job_id, path):
+    with app.app_context():
+        job = db.session.get(ImportJob, job_id)
+        if job is None or job.status != 'pending':
+            # already given up on as stale while it waited in the queue
+            _remove(path)
+            return
+        job.status = 'running'
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+
+        def progress(result):
+            # Committing here makes each batch durable and visible to the status endpoint.
+            job.processed = result['processed']
+            job.created = result['created']
+            job.skipped = result['skipped']
+            job.error_rows = json.dumps(result['error_rows'])
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+
+        try:
+            with open(path, 'rb') as f:
+                result = import_products(
+                    f, job.filename, job.user_id,
+                    batch_size=app.config.get('IMPORT_BATCH_SIZE', IMPORT_BATCH_SIZE),
+                    progress=progress,
+                )
+            job.status = 'done'
+            prewarm_qr(result['prewarm'])
+        except ImportFormatError as e:
+            db.session.rollback()
+            job.status, job.error_key, job.error_detail = 'failed', e.key, e.detail
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception(e)
+            job.status, job.error_key, job.error_detail = 'failed', 'import_error', str(e)
+        finally:
+            _remove(path)
+        job.finished_at = job.updated_at = datetime.utcnow()
+        db.session.commit()
+        db.session.remove()
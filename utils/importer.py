@@ -0,0 +1,300 @@
+"""
+Streaming product import: incremental CSV / JSON / NDJSON parsing with batched bulk inserts.
+"""
+import csv
+import io
+import json
+import re
+import uuid
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import Product, normalize_product_name
+from utils.qr import qr_payload, QR_PREWARM_LIMIT
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_EXTENSIONS = ('.csv', '.json', '.ndjson', '.jsonl')
+MAX_ERROR_ROWS = 20
+SNIFF_SAMPLE_SIZE = 64 * 1024
+JSON_CHUNK_SIZE = 64 * 1024
+# Largest single JSON record (or NDJSON line) buffered while looking for its end.
+JSON_MAX_RECORD_SIZE = 1024 * 1024
+
+_WRAPPED_ARRAY_RE = re.compile(r'\{\s*"products"\s*:\s*\[')
+_JSON_WS = ' \t\r\n'
+
+
+class ImportFormatError(ValueError):
+    """File-level problem; `key` is a translation key, `detail` optional extra text."""
+
+    def __init__(self, key, detail=''):
+        super().__init__(key)
+        self.key = key
+        self.detail = detail
+
+
+class _RecordTooLarge(Exception):
+    """No valid JSON value within JSON_MAX_RECORD_SIZE chars; the rest of the input is not read."""
+
+
+def parse_import_row(row):
+    key_map = {}
+    for k in row:
+        if k is None:
+            continue
+        s = (k if isinstance(k, str) else str(k)).strip().lstrip('\ufeff')
+        if s:
+            key_map[s.lower()] = k
+    name_key = next((key_map[k] for k in ('name', 'nome', 'product', 'produto') if k in key_map), None)
+    price_key = next((key_map[k] for k in ('price', 'preco', 'preço') if k in key_map), None)
+    if not name_key or not price_key:
+        return None, None
+    name = (row.get(name_key) or '').strip()
+    if not name:
+        return None, None
+    try:
+        price = float(str(row.get(price_key) or '0').replace(',', '.').strip())
+    except (TypeError, ValueError):
+        return name, None
+    if price <= 0:
+        return name, None
+    return name, round(price, 2)
+
+
+def _lines(sample, rest):
+    """Re-join the sniffed sample with the remaining stream, line by line."""
+    pending = ''
+    for line in io.StringIO(sample, newline=''):
+        if line.endswith(('\n', '\r')):
+            yield pending + line
+            pending = ''
+        else:
+            pending += line
+    for line in rest:
+        if pending:
+            line, pending = pending + line, ''
+        yield line
+    if pending:
+        yield pending
+
+
+def _sniff_delimiter(sample):
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=';,\t').delimiter
+    except csv.Error:
+        header = sample.split('\n', 1)[0]
+        return ';' if header.count(';') > header.count(',') else ','
+
+
+def iter_csv_rows(text_stream):
+    """Yield (line_number, row_dict) with the delimiter sniffed from the first SNIFF_SAMPLE_SIZE chars."""
+    sample = text_stream.read(SNIFF_SAMPLE_SIZE)
+    if not sample:
+        return
+    reader = csv.DictReader(_lines(sample, text_stream), delimiter=_sniff_delimiter(sample))
+    if not reader.fieldnames or len(reader.fieldnames) < 2:
+        return
+    for i, row in enumerate(reader):
+        yield i + 2, row
+
+
+class _JsonStream:
+    """Incremental reader over a text stream; keeps only an unparsed tail in memory."""
+
+    def __init__(self, text_stream):
+        self.stream = text_stream
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.stream.read(JSON_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos > JSON_CHUNK_SIZE:
+            self.buf, self.pos = self.buf[self.pos:], 0
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        """Skip whitespace; return the next char or '' at end of input."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _JSON_WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def match(self, pattern, min_len=64):
+        while len(self.buf) - self.pos < min_len and self._fill():
+            pass
+        m = pattern.match(self.buf, self.pos)
+        if m:
+            self.pos = m.end()
+        return m is not None
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A value ending exactly at the buffer edge may be truncated (e.g. a number).
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ImportFormatError('import_json_invalid', str(e))
+                if len(self.buf) - self.pos > JSON_MAX_RECORD_SIZE:
+                    raise _RecordTooLarge()
+            self._fill()
+
+
+def iter_json_items(text_stream):
+    """
+    Yield (item_number, item) from a JSON array, an object whose first key is "products",
+    or NDJSON / concatenated objects, without loading the whole document. A record that is still not
+    valid JSON after JSON_MAX_RECORD_SIZE chars is yielded as None (a row error) and ends the input.
+    """
+    js = _JsonStream(text_stream)
+    first = js.peek()
+    if first == '[':
+        js.pos += 1
+    elif first == '{' and js.match(_WRAPPED_ARRAY_RE):
+        pass
+    elif first == '{':
+        n = 0
+        while js.peek():
+            try:
+                obj = js.value()
+            except _RecordTooLarge:
+                yield n + 1, None
+                return
+            items = obj.get('products') if isinstance(obj, dict) else None
+            for item in (items if isinstance(items, list) else [obj]):
+                n += 1
+                yield n, item
+        return
+    elif first == '':
+        return
+    else:
+        raise ImportFormatError('import_json_format')
+    n = 0
+    while True:
+        c = js.peek()
+        if c == ']':
+            return
+        if c == '':
+            raise ImportFormatError('import_json_invalid', 'unterminated array')
+        if n and c == ',':
+            js.pos += 1
+        n += 1
+        try:
+            item = js.value()
+        except _RecordTooLarge:
+            yield n, None
+            return
+        yield n, item
+
+
+def iter_import_rows(binary_stream, filename):
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', errors='replace', newline='')
+    if filename.lower().endswith('.csv'):
+        return iter_csv_rows(text_stream)
+    return iter_json_items(text_stream)
+
+
+def _existing_normalized(user_id, keys):
+    """Index probe: which of `keys` already exist for this owner."""
+    q = db.session.query(Product.name_normalized).filter(
+        Product.user_id == user_id,
+        Product.name_normalized.in_(keys),
+    )
+    return {n for (n,) in q}
+
+
+def _insert_batch(rows):
+    """Insert rows; return the ids actually inserted (SQLite skips names taken concurrently)."""
+    conn = db.session.connection()
+    dialect = conn.dialect.name
+    if dialect == 'postgresql':
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for r in rows:
+            writer.writerow([r['id'], r['name'], r['name_normalized'], r['price'], r['created_at'].isoformat(), r['user_id']])
+        buf.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                'COPY "product" (id, name, name_normalized, price, created_at, user_id) FROM STDIN WITH (FORMAT csv)', buf
+            )
+        finally:
+            cursor.close()
+    elif dialect == 'sqlite':
+        table = Product.__table__
+        stmt = sqlite_insert(table).on_conflict_do_nothing().returning(table.c.id)
+        return {r[0] for r in conn.execute(stmt, rows)}
+    else:
+        conn.execute(insert(Product.__table__), rows)
+    return {r['id'] for r in rows}
+
+
+def import_products(binary_stream, filename, user_id, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Parse and insert products in batches of `batch_size` inside the current transaction; the caller
+    commits, either once at the end or per batch from `progress(result)`, which runs after each batch.
+    Duplicates of existing names (per owner, case-insensitive) are found with one index probe per batch.
+    Return {'processed', 'created', 'skipped', 'error_rows', 'prewarm'}, where 'prewarm' holds QR payloads
+    of the first created rows. Raises ImportFormatError for unreadable files.
+    """
+    result = {'processed': 0, 'created': 0, 'skipped': 0, 'error_rows': []}
+    warm = []
+    batch = {}
+
+    def flush():
+        if batch:
+            existing = _existing_normalized(user_id, list(batch))
+            rows = [r for key, r in batch.items() if key not in existing]
+            if rows:
+                inserted = _insert_batch(rows)
+                rows = [r for r in rows if r['id'] in inserted]
+            result['created'] += len(rows)
+            result['skipped'] += len(batch) - len(rows)
+            if len(warm) < QR_PREWARM_LIMIT:
+                warm.extend(qr_payload(r['id'], r['name'], r['price']) for r in rows[:QR_PREWARM_LIMIT - len(warm)])
+            batch.clear()
+        if progress:
+            progress(result)
+
+    for row_number, item in iter_import_rows(binary_stream, filename):
+        result['processed'] += 1
+        if not isinstance(item, dict):
+            if len(result['error_rows']) < MAX_ERROR_ROWS:
+                result['error_rows'].append(row_number)
+            continue
+        name, price = parse_import_row(item)
+        if name is None and price is None:
+            continue
+        if price is None:
+            if len(result['error_rows']) < MAX_ERROR_ROWS:
+                result['error_rows'].append(row_number)
+            continue
+        key = normalize_product_name(name)
+        if key in batch:
+            result['skipped'] += 1
+            continue
+        batch[key] = {
+            'id': str(uuid.uuid4()), 'name': name, 'name_normalized': key, 'price': price,
+            'user_id': user_id, 'created_at': datetime.utcnow(),
+        }
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    result['prewarm'] = warm
+    return result
@@ -0,0 +1,40 @@
+"""
+Keyset pagination helpers: opaque cursor tokens over (created_at, id) and page size limits.
+"""
+import base64
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, row_id):
+    """Return a URL-safe token for the last row of a page."""
+    raw = f'{created_at.isoformat()}|{row_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (created_at, id) from a token; raise InvalidCursor if malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        ts, row_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|', 1)
+        created_at = datetime.fromisoformat(ts)
+    except Exception:
+        raise InvalidCursor(token)
+    if not row_id:
+        raise InvalidCursor(token)
+    return created_at, row_id
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Clamp a ?limit= value to [1, maximum]; fall back to default when missing or invalid."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
@@ -0,0 +1,108 @@
+"""
+Password hashing: the Werkzeug method comes from PASSWORD_HASH_METHOD (e.g. `scrypt:32768:8:1`,
+`pbkdf2:sha256:600000`), hashing and verification run on a small dedicated pool so a burst of logins
+can't use every core, and hashes made with other parameters are flagged for rehash on login.
+Login latencies are kept in a rolling sample (p50/p99 logged every LATENCY_LOG_EVERY logins).
+"""
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_HASH_METHOD = 'scrypt'
+# hashlib's scrypt/pbkdf2 release the GIL, so threads run hashes in parallel up to this many at once.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+# Hashes allowed to wait for a worker before new ones are refused (PasswordHashBusy).
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))
+PASSWORD_HASH_TIMEOUT = 15
+LATENCY_SAMPLES = 1024
+LATENCY_LOG_EVERY = 100
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='pwhash')
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+_prefixes = {}
+_latencies = deque(maxlen=LATENCY_SAMPLES)
+_latency_lock = threading.Lock()
+_logins = 0
+
+
+class PasswordHashBusy(Exception):
+    """The hashing pool is saturated or a hash did not finish in time."""
+
+
+def hash_method():
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_HASH_METHOD
+    return DEFAULT_HASH_METHOD
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordHashBusy()
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeout:
+        raise PasswordHashBusy()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, hash_method())
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+
+def _method_prefix(method):
+    """Parameter prefix Werkzeug writes for `method` (defaults filled in), e.g. 'scrypt:32768:8:1'."""
+    prefix = _prefixes.get(method)
+    if prefix is None:
+        prefix = _prefixes[method] = _run(generate_password_hash, '', method).split('$', 1)[0]
+    return prefix
+
+
+def check_hash_method(method):
+    """Validate `method` once at startup, so a typo fails at boot rather than on every login."""
+    try:
+        _prefixes[method] = generate_password_hash('', method).split('$', 1)[0]
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Invalid PASSWORD_HASH_METHOD {method!r}: {e}') from e
+
+
+def needs_rehash(pwhash):
+    """True when pwhash was made with different parameters than the configured method."""
+    return (pwhash or '').split('$', 1)[0] != _method_prefix(hash_method())
+
+
+def record_login_latency(seconds):
+    global _logins
+    with _latency_lock:
+        _latencies.append(seconds)
+        _logins += 1
+        log_now = _logins % LATENCY_LOG_EVERY == 0
+    if log_now and has_app_context():
+        stats = login_latency_stats()
+        current_app.logger.info(
+            f"Login latency over last {stats['count']}: p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms"
+        )
+
+
+def login_latency_stats():
+    """{'count', 'p50_ms', 'p99_ms'} over the last LATENCY_SAMPLES logins in this process."""
+    with _latency_lock:
+        samples = sorted(_latencies)
+    if not samples:
+        return {'count': 0, 'p50_ms': None, 'p99_ms': None}
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 1)
+    return {'count': len(samples), 'p50_ms': pct(0.50), 'p99_ms': pct(0.99)}
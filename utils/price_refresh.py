@@ -0,0 +1,110 @@
+"""
+Catalog-wide Discogs price refresh: each product is matched to a release (its stored discogs_release_id,
+else the first search hit for its name) and gets that release's lowest marketplace price. Every request
+waits on the shared rate limiter, each product is committed as soon as it is priced, and products are
+visited never-priced first, then oldest price first, so an interrupted run picks up where it stopped.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+from extensions import db
+from models import Product
+from utils.discogs import (
+    DiscogsError, auth_headers, cached_get, release_price, release_spec, search_spec,
+)
+
+PRICE_REFRESH_MAX_AGE = timedelta(days=7)
+PRICE_REFRESH_BATCH = 100
+RATE_LIMIT_RETRIES = 3
+MAX_CONSECUTIVE_FAILURES = 10
+
+_DUE_COLUMNS = (Product.id, Product.name, Product.discogs_release_id, Product.suggested_price_at)
+
+
+def _products_due(cutoff, batch):
+    """Yield rows never priced (by id), then rows priced before cutoff (by suggested_price_at, id)."""
+    after_id = ''
+    while True:
+        rows = db.session.query(*_DUE_COLUMNS).filter(
+            Product.suggested_price_at.is_(None), Product.id > after_id
+        ).order_by(Product.id).limit(batch).all()
+        if not rows:
+            break
+        yield from rows
+        after_id = rows[-1].id
+    after = None
+    while True:
+        q = db.session.query(*_DUE_COLUMNS).filter(Product.suggested_price_at < cutoff)
+        if after is not None:
+            q = q.filter(or_(
+                Product.suggested_price_at > after[0],
+                and_(Product.suggested_price_at == after[0], Product.id > after[1]),
+            ))
+        rows = q.order_by(Product.suggested_price_at, Product.id).limit(batch).all()
+        if not rows:
+            return
+        yield from rows
+        after = (rows[-1].suggested_price_at, rows[-1].id)
+
+
+def _lookup(row, currency, headers):
+    """Return (release_id, price, currency); release_id is None when the name has no match."""
+    release_id = row.discogs_release_id
+    if not release_id:
+        search = cached_get(search_spec(row.name), headers, allow_stale=False, throttle=True)
+        hit = next((r for r in search['results'] if r.get('id')), None)
+        if hit is None:
+            return None, None, currency
+        release_id = hit['id']
+    release = cached_get(release_spec(release_id, currency), headers, allow_stale=False, throttle=True)
+    price, curr = release_price(release, currency)
+    return release_id, price, curr
+
+
+def _lookup_retrying(row, currency, headers):
+    """_lookup, retried after a 429 (the rate limiter has already backed off by then)."""
+    for _ in range(RATE_LIMIT_RETRIES):
+        try:
+            return _lookup(row, currency, headers)
+        except DiscogsError as e:
+            if e.status != 429:
+                raise
+    return _lookup(row, currency, headers)
+
+
+def refresh_prices(currency='USD', max_age=PRICE_REFRESH_MAX_AGE, limit=None, log=None):
+    """
+    Price products whose suggestion is missing or older than max_age. Products that fail stay due for the
+    next run; the run stops after MAX_CONSECUTIVE_FAILURES in a row. Return counts by outcome.
+    """
+    counts = {'priced': 0, 'no_price': 0, 'unmatched': 0, 'failed': 0}
+    headers = auth_headers()
+    cutoff = datetime.utcnow() - max_age
+    failures = 0
+    for n, row in enumerate(_products_due(cutoff, PRICE_REFRESH_BATCH)):
+        if limit is not None and n >= limit:
+            break
+        try:
+            release_id, price, curr = _lookup_retrying(row, currency, headers)
+        except DiscogsError as e:
+            counts['failed'] += 1
+            failures += 1
+            if log:
+                log(f'{row.name}: {e}')
+            if failures >= MAX_CONSECUTIVE_FAILURES:
+                if log:
+                    log('Too many consecutive Discogs failures; stopping.')
+                break
+            continue
+        failures = 0
+        values = {Product.suggested_price_at: datetime.utcnow(), Product.suggested_price: price,
+                  Product.suggested_currency: curr if price is not None else None}
+        if release_id:
+            values[Product.discogs_release_id] = release_id
+        db.session.query(Product).filter(Product.id == row.id).update(values, synchronize_session=False)
+        db.session.commit()
+        counts['unmatched' if not release_id else 'priced' if price is not None else 'no_price'] += 1
+        if log:
+            log(f'{row.name}: {price if price is not None else "-"} {curr if price is not None else ""}'.rstrip())
+    return counts
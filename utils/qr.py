@@ -0,0 +1,181 @@
+"""
+Product QR codes: payload, rendering and a content-addressed cache (in-process LRU + instance/qr_cache).
+"""
+import base64
+import binascii
+import hashlib
+import io
+import itertools
+import json
+import os
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import qrcode
+from qrcode.image.svg import SvgPathImage
+
+from config import get_instance_dir
+
+QR_MEMORY_CACHE_SIZE = 512
+QR_PREWARM_LIMIT = 200
+COMPACT_CODE_PREFIX = 'AP1:'
+_B32_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567'
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+_prewarm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qr-prewarm')
+
+
+def compact_product_code(product_id):
+    """
+    Versioned short code for a UUID product id: 'AP1:' + base32(uuid bytes) + ':' + 2-char checksum.
+    Uppercase base32 fits QR alphanumeric mode, keeping codes at version 2. None for non-UUID ids.
+    """
+    try:
+        raw = uuid.UUID(product_id).bytes
+    except (TypeError, ValueError, AttributeError):
+        return None
+    key = base64.b32encode(raw).decode('ascii').rstrip('=')
+    return f'{COMPACT_CODE_PREFIX}{key}:{_checksum(key)}'
+
+
+def parse_product_code(code):
+    """Return the product id for a compact code, or None if it is malformed or fails its checksum."""
+    if not isinstance(code, str) or not code.startswith(COMPACT_CODE_PREFIX):
+        return None
+    key, _, check = code[len(COMPACT_CODE_PREFIX):].strip().upper().partition(':')
+    if len(key) != 26 or check != _checksum(key):
+        return None
+    try:
+        return str(uuid.UUID(bytes=base64.b32decode(key + '=' * 6)))
+    except (ValueError, binascii.Error):
+        return None
+
+
+def _checksum(key):
+    n = zlib.crc32(key.encode('ascii')) & 0x3FF
+    return _B32_ALPHABET[n >> 5] + _B32_ALPHABET[n & 0x1F]
+
+
+def qr_payload(product_id, name, price):
+    """Compact code for UUID ids; legacy JSON payload otherwise."""
+    return compact_product_code(product_id) or json.dumps({'id': product_id, 'name': name, 'price': price})
+
+
+def qr_key(payload):
+    """Content hash of a payload; used as cache key, ETag and URL version."""
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def qr_etag(payload, fmt='png'):
+    key = qr_key(payload)
+    return key if fmt == 'png' else f'{key}-{fmt}'
+
+
+def _make_qr(payload):
+    qr = qrcode.QRCode(box_size=10, border=5)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr
+
+
+def render_qr_png(payload):
+    img = _make_qr(payload).make_image(fill_color='black', back_color='white')
+    img_io = io.BytesIO()
+    img.save(img_io, 'PNG')
+    return img_io.getvalue()
+
+
+def render_qr_svg(payload):
+    """Vector output; no PIL rasterisation."""
+    return _make_qr(payload).make_image(image_factory=SvgPathImage).to_string()
+
+
+_RENDERERS = {'png': render_qr_png, 'svg': render_qr_svg}
+
+
+def _cache_dir():
+    path = os.path.join(get_instance_dir(), 'qr_cache')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _disk_path(name):
+    return os.path.join(_cache_dir(), name)
+
+
+def _remember(name, data):
+    with _memory_lock:
+        _memory[name] = data
+        _memory.move_to_end(name)
+        while len(_memory) > QR_MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def cached_qr(payload, fmt='png'):
+    """Return cached image bytes for payload, or None if neither tier has it."""
+    name = f'{qr_key(payload)}.{fmt}'
+    with _memory_lock:
+        data = _memory.get(name)
+        if data is not None:
+            _memory.move_to_end(name)
+            return data
+    try:
+        with open(_disk_path(name), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    _remember(name, data)
+    return data
+
+
+def store_qr(payload, data, fmt='png'):
+    name = f'{qr_key(payload)}.{fmt}'
+    path = _disk_path(name)
+    try:
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    _remember(name, data)
+
+
+def get_qr(payload, fmt='png'):
+    """Return image bytes in fmt ('png' or 'svg'), rendering only on a miss in both cache tiers."""
+    data = cached_qr(payload, fmt)
+    if data is None:
+        data = _RENDERERS[fmt](payload)
+        store_qr(payload, data, fmt)
+    return data
+
+
+def evict_qr(payload):
+    key = qr_key(payload)
+    for fmt in _RENDERERS:
+        name = f'{key}.{fmt}'
+        with _memory_lock:
+            _memory.pop(name, None)
+        try:
+            os.remove(_disk_path(name))
+        except OSError:
+            pass
+
+
+def _warm(payloads):
+    for payload in payloads:
+        try:
+            get_qr(payload)
+        except Exception:
+            pass
+
+
+def prewarm_qr(payloads):
+    """Render QR codes in the background so the first catalog view hits the cache."""
+    payloads = list(itertools.islice(payloads, QR_PREWARM_LIMIT))
+    if payloads:
+        _prewarm_executor.submit(_warm, payloads)
@@ -0,0 +1,124 @@
+"""
+Re-encrypt user identity fields under the primary Fernet key after a rotation: the user table is walked
+in id order in chunks, each chunk is committed on its own, progress is checkpointed to
+instance/reencrypt.json (per primary key) and the crypto runs on a process pool.
+"""
+import json
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import bindparam
+
+from config import get_instance_dir
+from extensions import db
+from models import User
+from utils.encryption import get_encryption_keys, fernet_from_keys, primary_key_id
+
+REENCRYPT_CHUNK_SIZE = 500
+
+_worker_fernet = None
+
+
+def _progress_path():
+    return os.path.join(get_instance_dir(), 'reencrypt.json')
+
+
+def load_progress(key_id):
+    """Return (last_id, done) recorded for this primary key, or (0, False)."""
+    try:
+        with open(_progress_path(), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return 0, False
+    if data.get('key_id') != key_id:
+        return 0, False
+    return int(data.get('last_id') or 0), bool(data.get('done'))
+
+
+def _save_progress(key_id, last_id, done=False):
+    path = _progress_path()
+    fd, tmp = tempfile.mkstemp(prefix='.reencrypt-', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'key_id': key_id, 'last_id': last_id, 'done': done}, f)
+    os.replace(tmp, path)
+
+
+def _init_worker(keys):
+    global _worker_fernet
+    _worker_fernet = fernet_from_keys(keys)
+
+
+def _rotate_rows(rows):
+    """Worker: [(id, username_enc, email_enc)] -> update params with old and new ciphertexts."""
+    f = _worker_fernet
+    return [{
+        'b_id': uid, 'b_old_username': u, 'b_old_email': e,
+        'b_username': f.rotate(u), 'b_email': f.rotate(e),
+    } for uid, u, e in rows]
+
+
+def _chunks(after_id, chunk_size):
+    while True:
+        rows = db.session.query(User.id, User.username_enc, User.email_enc).filter(
+            User.id > after_id
+        ).order_by(User.id).limit(chunk_size).all()
+        if not rows:
+            return
+        # bytes() so rows pickle to the pool (Postgres drivers return memoryview)
+        chunk = [(uid, bytes(u), bytes(e)) for uid, u, e in rows]
+        after_id = chunk[-1][0]
+        yield chunk
+
+
+_UPDATE = User.__table__.update().where(
+    User.__table__.c.id == bindparam('b_id'),
+    # Skip rows changed since they were read; the app already wrote those with the primary key.
+    User.__table__.c.username_enc == bindparam('b_old_username'),
+    User.__table__.c.email_enc == bindparam('b_old_email'),
+).values(username_enc=bindparam('b_username'), email_enc=bindparam('b_email'))
+
+
+def reencrypt_users(chunk_size=REENCRYPT_CHUNK_SIZE, workers=None, restart=False, log=None):
+    """
+    Rewrite every user's username_enc/email_enc under the primary key. Resumes after the last
+    committed chunk unless `restart`. Return the number of rows processed in this run.
+    """
+    keys = get_encryption_keys()
+    key_id = primary_key_id()
+    last_id, done = (0, False) if restart else load_progress(key_id)
+    if done:
+        if log:
+            log('Already re-encrypted under the current primary key (use --restart to run again).')
+        return 0
+    workers = workers or min(4, os.cpu_count() or 1)
+    processed = 0
+
+    def apply(chunk_last_id, params):
+        nonlocal processed
+        db.session.execute(_UPDATE, params)
+        db.session.commit()
+        _save_progress(key_id, chunk_last_id)
+        processed += len(params)
+        if log:
+            log(f'Re-encrypted up to user id {chunk_last_id} ({processed} row(s) this run)')
+
+    if workers <= 1:
+        _init_worker(keys)
+        for chunk in _chunks(last_id, chunk_size):
+            apply(chunk[-1][0], _rotate_rows(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(keys,)) as pool:
+            pending = deque()
+            for chunk in _chunks(last_id, chunk_size):
+                pending.append((chunk[-1][0], pool.submit(_rotate_rows, chunk)))
+                # Apply in order so the checkpoint only ever moves past fully committed chunks.
+                while len(pending) >= workers * 2 or (pending and pending[0][1].done()):
+                    chunk_last_id, future = pending.popleft()
+                    apply(chunk_last_id, future.result())
+            while pending:
+                chunk_last_id, future = pending.popleft()
+                apply(chunk_last_id, future.result())
+    _save_progress(key_id, 0, done=True)
+    return processed